@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+
+"""End-to-end benchmark of leo against local fake services.
+
+Every config is uploaded by a separate `leo` process with HTTP backend,
+whose YouTube, timedtext and LinguaLeo URLs point to fake_services.
+Throughput, per-video latency (from the first subtitles request
+to publishing) and peak RSS of the process are reported:
+
+    $ python benchmarks/e2e.py --channels 10 100 1000 -- --upload-workers 4
+
+Arguments after '--' are passed to leo.
+"""
+
+import argparse
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from fake_services import FakeServices, LAST_REFRESH, Options, playlist_id
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD_FLAG = '--child'
+
+
+def main():
+    """Run benchmark for every number of channels and print report."""
+    if len(sys.argv) > 1 and sys.argv[1] == CHILD_FLAG:
+        _run_leo(sys.argv[2], sys.argv[3:])
+        return
+
+    argv = sys.argv[1:]
+    leo_args = []
+    if '--' in argv:
+        leo_args = argv[argv.index('--') + 1:]
+        argv = argv[:argv.index('--')]
+
+    args = _get_parser().parse_args(argv)
+    options = Options(
+        videos_per_channel=args.videos_per_channel,
+        captions=args.captions,
+        api_latency=args.api_latency / 1000.0,
+        subtitle_latency=args.subtitle_latency / 1000.0,
+        leo_latency=args.leo_latency / 1000.0,
+        missing_rate=args.missing_rate,
+        error_rate=args.error_rate,
+        reject_rate=args.reject_rate,
+        processing_polls=args.processing_polls
+    )
+
+    services = FakeServices(options)
+    services.start()
+
+    print '{:>8} {:>7} {:>9} {:>7} {:>9} {:>10} {:>8} {:>8} {:>9}'.format(
+        'channels', 'videos', 'published', 'failed', 'seconds',
+        'videos/min', 'p50 s', 'p95 s', 'RSS MB'
+    )
+    try:
+        for channels in args.channels:
+            result = run_config(services, channels, args.publish_delay, leo_args,
+                                args.keep_logs)
+            print '{channels:>8} {videos:>7} {published:>9} {failed:>7} {seconds:>9.2f} ' \
+                  '{videos_per_minute:>10.1f} {p50:>8.3f} {p95:>8.3f} {peak_rss_mb:>9.1f}'.format(
+                      **result
+                  )
+    finally:
+        services.stop()
+
+
+def run_config(services, channels, publish_delay, leo_args, keep_logs=False):
+    """Upload new videos of generated channels with leo process.
+
+    Args:
+        services (FakeServices): running fake services.
+        channels (int): number of channels in the config.
+        publish_delay (float): initial delay between publish attempts.
+        leo_args (list): additional arguments of leo.
+        keep_logs (bool): True, if output of leo has to be kept.
+
+    Returns:
+        dict: results of the run.
+    """
+    services.reset()
+    directory = tempfile.mkdtemp(prefix='leo-benchmark-')
+    config_filename = _write_config(services, directory, channels, publish_delay)
+    log_filename = os.path.join(directory, 'leo.log')
+
+    try:
+        start_time = time.time()
+        with open(log_filename, 'w') as log:
+            process = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), CHILD_FLAG, services.url,
+                 '--config', config_filename, '--backend', 'http'] + leo_args,
+                cwd=directory,
+                stdout=log,
+                stderr=subprocess.STDOUT
+            )
+            # Resource usage of this process only, not of all children.
+            _, status, usage = os.wait4(process.pid, 0)
+            process.returncode = status
+        seconds = time.time() - start_time
+
+        if status:
+            with open(log_filename) as log:
+                sys.stderr.write(log.read())
+            raise RuntimeError('leo exited with status {}'.format(status))
+    finally:
+        if keep_logs:
+            print 'Output of leo: {}'.format(log_filename)
+        else:
+            shutil.rmtree(directory)
+
+    videos = channels * services.options.videos_per_channel
+    latencies = services.latencies()
+    return dict(
+        channels=channels,
+        videos=videos,
+        published=len(services.published),
+        failed=videos - len(services.published),
+        seconds=seconds,
+        videos_per_minute=len(services.published) / seconds * 60,
+        p50=percentile(latencies, 50),
+        p95=percentile(latencies, 95),
+        # ru_maxrss is in kilobytes on Linux.
+        peak_rss_mb=usage.ru_maxrss / 1024.0
+    )
+
+
+def percentile(values, percent):
+    """Return nearest-rank percentile of sorted values, 0 if there are none."""
+    if not values:
+        return 0
+    return values[max(int(math.ceil(percent / 100.0 * len(values))) - 1, 0)]
+
+
+def _write_config(services, directory, channels, publish_delay):
+    """Write discovery document and config with generated channels.
+
+    Returns:
+        str: name of the config file.
+    """
+    discovery_filename = os.path.join(directory, 'youtube-v3.json')
+    with open(discovery_filename, 'w') as outfile:
+        json.dump(services.discovery_document(), outfile)
+
+    config = dict(
+        email='benchmark@example.com',
+        password=services.options.password,
+        api_key='benchmark',
+        channels=[
+            dict(name='Channel {}'.format(i),
+                 id='UC{:022d}'.format(i),
+                 last_refresh=LAST_REFRESH,
+                 uploads_playlist=playlist_id(i))
+            for i in range(channels)
+        ],
+        settings=dict(
+            youtube=dict(
+                discovery_cache=discovery_filename,
+                discovery_refresh_days=365,
+                response_cache='',
+                daily_quota=10 ** 9,
+                quota_reserve=0
+            ),
+            subtitle_cache=dict(directory=os.path.join(directory, 'subtitles')),
+            subtitle_http=dict(retries=1, backoff=0.05),
+            publish=dict(initial_delay=publish_delay, max_delay=1),
+            browser=dict(cookies_file='')
+        )
+    )
+
+    config_filename = os.path.join(directory, 'config.json')
+    with open(config_filename, 'w') as outfile:
+        json.dump(config, outfile)
+    return config_filename
+
+
+def _run_leo(url, argv):
+    """Run leo with its services' URLs pointed to fake services."""
+    sys.path.insert(0, ROOT_DIR)
+    import leo.backends as backends
+    import leo.main
+
+    backends.HOME_URL = url + '/ru/'
+    backends.LOGIN_URL = url + '/ru/login'
+    backends.ADD_CONTENT_URL = url + '/ru/jungle/add'
+    leo.main.CONTENT_LIST_URL = url + '/ru/jungle/my?page={page}'
+    leo.main.TIMEDTEXT_URL = url + '/timedtext?lang=en&v={}'
+
+    sys.argv = ['leo'] + argv
+    leo.main.main()
+
+
+def _get_parser():
+    parser = argparse.ArgumentParser(
+        description='Benchmark leo end to end against local fake services.'
+    )
+
+    parser.add_argument(
+        '--channels',
+        metavar='N',
+        type=int,
+        nargs='+',
+        default=[10, 100, 1000],
+        help='Numbers of channels in benchmarked configs (10 100 1000 is default)'
+    )
+
+    parser.add_argument(
+        '--videos-per-channel',
+        metavar='N',
+        type=int,
+        default=1,
+        help='Number of new videos of every channel (1 is default)'
+    )
+
+    parser.add_argument(
+        '--captions',
+        metavar='N',
+        type=int,
+        default=200,
+        help='Number of captions in every video (200 is default)'
+    )
+
+    parser.add_argument(
+        '--api-latency',
+        metavar='MS',
+        type=float,
+        default=5,
+        help='Latency of YouTube API in milliseconds (5 is default)'
+    )
+
+    parser.add_argument(
+        '--subtitle-latency',
+        metavar='MS',
+        type=float,
+        default=20,
+        help='Latency of timedtext in milliseconds (20 is default)'
+    )
+
+    parser.add_argument(
+        '--leo-latency',
+        metavar='MS',
+        type=float,
+        default=20,
+        help='Latency of LinguaLeo in milliseconds (20 is default)'
+    )
+
+    parser.add_argument(
+        '--missing-rate',
+        metavar='RATE',
+        type=float,
+        default=0.05,
+        help='Fraction of videos without English subtitles (0.05 is default)'
+    )
+
+    parser.add_argument(
+        '--error-rate',
+        metavar='RATE',
+        type=float,
+        default=0.02,
+        help='Fraction of videos whose subtitles fail with HTTP 503 (0.02 is default)'
+    )
+
+    parser.add_argument(
+        '--reject-rate',
+        metavar='RATE',
+        type=float,
+        default=0.02,
+        help='Fraction of videos rejected by LinguaLeo (0.02 is default)'
+    )
+
+    parser.add_argument(
+        '--processing-polls',
+        metavar='N',
+        type=int,
+        default=1,
+        help='Number of Publish page loads while video is processing (1 is default)'
+    )
+
+    parser.add_argument(
+        '--publish-delay',
+        metavar='SECONDS',
+        type=float,
+        default=0.1,
+        help='Initial delay between publish attempts (0.1 is default)'
+    )
+
+    parser.add_argument(
+        '--keep-logs',
+        action='store_true',
+        help='Keep output of leo and print where it is'
+    )
+
+    return parser
+
+
+if __name__ == '__main__':
+    main()
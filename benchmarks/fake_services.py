@@ -0,0 +1,376 @@
+# -*- coding: utf-8 -*-
+
+"""Local stand-ins for YouTube Data API, timedtext and LinguaLeo.
+
+All services are served by one threaded HTTP server:
+
+- /youtube/v3/<resource> answers playlistItems, channels and videos
+  requests of the API client built from discovery_document();
+- /timedtext returns generated XML captions;
+- /ru/... imitates LinguaLeo sign in, 'Add content' and Publish pages.
+
+Latency and failures are injected per service. Failures are chosen
+by hash of the video ID, so every run of the same config fails
+on the same videos.
+"""
+
+import BaseHTTPServer
+import cgi
+import hashlib
+import json
+import SocketServer
+import threading
+import time
+import urlparse
+
+# Time of the channels' last refresh in benchmark configs.
+# Every generated video is published after it.
+LAST_REFRESH = '2017-01-01T00:00:00Z'
+
+SESSION_COOKIE = 'sid'
+
+# Image on the 'Add content' page, which only a browser loads.
+BANNER_SIZE = 200 * 1024
+
+
+class Options(object):
+    """Behaviour of the fake services.
+
+    Latencies are in seconds, rates are fractions of the videos.
+    """
+
+    def __init__(self, videos_per_channel=1, captions=200, api_latency=0.005,
+                 subtitle_latency=0.02, leo_latency=0.02, missing_rate=0.0,
+                 error_rate=0.0, reject_rate=0.0, processing_polls=1, password='password'):
+        """Initialize Options object.
+
+        Args:
+            videos_per_channel (int): number of new videos of every channel.
+            captions (int): number of captions in generated subtitles.
+            api_latency (float): delay of every YouTube API response.
+            subtitle_latency (float): delay of every timedtext response.
+            leo_latency (float): delay of every LinguaLeo response.
+            missing_rate (float): videos which have no English subtitles.
+            error_rate (float): videos whose subtitles always fail with 503.
+            reject_rate (float): videos which LinguaLeo does not accept.
+            processing_polls (int): number of Publish page loads
+                which show the video as still processing.
+            password (str): password accepted by the sign in form.
+        """
+        self.videos_per_channel = videos_per_channel
+        self.captions = captions
+        self.api_latency = api_latency
+        self.subtitle_latency = subtitle_latency
+        self.leo_latency = leo_latency
+        self.missing_rate = missing_rate
+        self.error_rate = error_rate
+        self.reject_rate = reject_rate
+        self.processing_polls = processing_polls
+        self.password = password
+
+
+class FakeServices(object):
+    """Runs fake services and records what happened to every video."""
+
+    def __init__(self, options):
+        """Initialize FakeServices object.
+
+        Args:
+            options (Options): behaviour of the services.
+        """
+        self.options = options
+        self.server = _Server(('127.0.0.1', 0), _Handler)
+        self.server.services = self
+        self.url = 'http://127.0.0.1:{}'.format(self.server.server_port)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def start(self):
+        """Serve requests in background thread."""
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        """Stop serving requests."""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reset(self):
+        """Forget recorded videos before the next run."""
+        with self._lock:
+            # Video ID to time of the first subtitles request.
+            self.subtitles_requested = {}
+            # Video ID to time when it was published.
+            self.published = {}
+            self.rejected = set()
+            # Submitted contents: video ID and number of Publish page loads.
+            self.contents = []
+            self.api_requests = 0
+
+    def latencies(self):
+        """Return seconds from the first subtitles request to publishing.
+
+        Returns:
+            list: sorted latencies of the published videos.
+        """
+        with self._lock:
+            return sorted(published - self.subtitles_requested[video_id]
+                          for video_id, published in self.published.items()
+                          if video_id in self.subtitles_requested)
+
+    def discovery_document(self):
+        """Return YouTube API discovery document pointing to this server.
+
+        Returns:
+            dict: minimal document with list methods of the used resources.
+        """
+        parameters = dict((name, dict(type='string', location='query'))
+                          for name in ('part', 'id', 'maxResults', 'pageToken',
+                                       'playlistId', 'forUsername'))
+        return dict(
+            kind='discovery#restDescription',
+            discoveryVersion='v1',
+            id='youtube:v3',
+            name='youtube',
+            version='v3',
+            rootUrl=self.url + '/',
+            servicePath='youtube/v3/',
+            batchPath='batch',
+            parameters={},
+            schemas=dict(Response=dict(id='Response', type='object')),
+            resources=dict(
+                (resource, dict(methods=dict(list=dict(
+                    id='youtube.{}.list'.format(resource),
+                    path=resource,
+                    httpMethod='GET',
+                    parameters=parameters,
+                    response={'$ref': 'Response'}
+                ))))
+                for resource in ('channels', 'playlistItems', 'videos')
+            )
+        )
+
+    def playlist_items(self, playlist_id):
+        """Return API response with new videos of the channel, newest first."""
+        channel_index = int(playlist_id[2:])
+        items = []
+        for index in reversed(range(self.options.videos_per_channel)):
+            items.append(dict(
+                contentDetails=dict(
+                    videoId=video_id(channel_index, index),
+                    videoPublishedAt='2017-02-01T{:02d}:{:02d}:00.000Z'.format(
+                        index // 60 % 24, index % 60
+                    )
+                ),
+                snippet=dict(title='Video {} of channel {}'.format(index, channel_index))
+            ))
+
+        with self._lock:
+            self.api_requests += 1
+        return dict(items=items)
+
+    def timedtext(self, video):
+        """Return status and XML captions of the video."""
+        with self._lock:
+            self.subtitles_requested.setdefault(video, time.time())
+
+        if _is_chosen(video, 'error', self.options.error_rate):
+            return 503, ''
+        if _is_chosen(video, 'missing', self.options.missing_rate):
+            return 200, ''
+
+        captions = ''.join(
+            '<text start="{}" dur="2.5">Caption {} of the video &amp; its text</text>'.format(
+                i * 3, i
+            )
+            for i in range(self.options.captions)
+        )
+        return 200, '<?xml version="1.0" encoding="utf-8" ?><transcript>{}</transcript>'.format(
+            captions
+        )
+
+    def submit(self, fields):
+        """Accept 'Add content' form.
+
+        Returns:
+            str: path of the Publish page, None if content is rejected.
+        """
+        video = fields.get('content_embed', '')[-11:]
+        if not fields.get('content_name') or _is_chosen(video, 'reject',
+                                                        self.options.reject_rate):
+            with self._lock:
+                self.rejected.add(video)
+            return None
+
+        with self._lock:
+            self.contents.append([video, 0])
+            return '/ru/jungle/publish/{}'.format(len(self.contents) - 1)
+
+    def is_processing(self, content_id):
+        """Count Publish page load and check if video is still processing."""
+        with self._lock:
+            content = self.contents[content_id]
+            content[1] += 1
+            return content[1] <= self.options.processing_polls
+
+    def publish(self, content_id):
+        """Publish submitted content."""
+        with self._lock:
+            self.published.setdefault(self.contents[content_id][0], time.time())
+
+
+def video_id(channel_index, index):
+    """Return 11 characters long ID of the generated video."""
+    return 'c{:05d}v{:04d}'.format(channel_index, index)
+
+
+def playlist_id(channel_index):
+    """Return ID of the uploads playlist of the generated channel."""
+    return 'UU{:022d}'.format(channel_index)
+
+
+def _is_chosen(video, failure, rate):
+    """Check if failure is injected for the video."""
+    if not rate:
+        return False
+    digest = hashlib.md5('{}:{}'.format(failure, video)).hexdigest()
+    return int(digest[:8], 16) < rate * 0x100000000
+
+
+class _Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Dispatches requests to the fake services."""
+
+    # Keep-alive connections, like the real services.
+    protocol_version = 'HTTP/1.1'
+    # Response is buffered and sent at once, so that Nagle's algorithm
+    # does not delay it, which would be latency of the fake server.
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        services = self.server.services
+        options = services.options
+        url = urlparse.urlparse(self.path)
+        query = dict(urlparse.parse_qsl(url.query))
+
+        if url.path.startswith('/youtube/v3/'):
+            time.sleep(options.api_latency)
+            if url.path.endswith('/playlistItems'):
+                return self._send_json(services.playlist_items(query['playlistId']))
+            return self._send_json(dict(items=[]))
+
+        if url.path == '/timedtext':
+            time.sleep(options.subtitle_latency)
+            status, body = services.timedtext(query.get('v', ''))
+            return self._send(status, body, content_type='text/xml')
+
+        time.sleep(options.leo_latency)
+        if url.path == '/static/banner.png':
+            return self._send(200, '\0' * BANNER_SIZE, content_type='image/png')
+
+        if url.path == '/ru/login':
+            return self._send(200, (
+                '<form method="post" action="/ru/login">'
+                '<input name="email"><input type="password" name="password"></form>'
+            ))
+
+        if url.path in ('/ru/', '/ru/dashboard'):
+            return self._send(200, '<html>{}</html>'.format(url.path))
+
+        if not self._is_signed_in():
+            return self._redirect('/ru/login')
+
+        if url.path == '/ru/jungle/add':
+            return self._send(200, (
+                '<img src="/static/banner.png">'
+                '<form id="addContentForm" method="post" action="/ru/jungle/add"'
+                ' enctype="multipart/form-data">'
+                '<input type="hidden" name="token" value="form-token">'
+                '<input name="content_embed"><input name="content_name">'
+                '<input type="file" name="content_srt">'
+                '<select id="genre_id" name="genre_id"><option value="1">Movie</option>'
+                '<option value="10">Educational video</option></select></form>'
+            ))
+
+        if url.path.startswith('/ru/jungle/publish/'):
+            content_id = int(url.path.rsplit('/', 1)[1])
+            if services.is_processing(content_id):
+                return self._send(200, '<p>Video is processing</p>')
+            return self._send(200, (
+                '<form method="post" action="/ru/jungle/publish">'
+                '<input type="hidden" name="content_id" value="{}">'
+                '<button id="publicContentBtn">Publish</button></form>'
+            ).format(content_id))
+
+        if url.path.startswith('/ru/jungle/content/'):
+            return self._send(200, '<p>Published</p>')
+
+        self._send(404, 'Not found')
+
+    def do_POST(self):
+        services = self.server.services
+        time.sleep(services.options.leo_latency)
+        fields = self._read_form()
+
+        if self.path == '/ru/login':
+            if fields.get('password') != services.options.password:
+                return self._send(200, '<p>Invalid password</p>')
+            return self._redirect('/ru/dashboard', cookie='{}=1'.format(SESSION_COOKIE))
+
+        if not self._is_signed_in():
+            return self._redirect('/ru/login')
+
+        if self.path == '/ru/jungle/add':
+            publish_path = services.submit(fields)
+            # Rejected content is returned to the form.
+            return self._redirect(publish_path or '/ru/jungle/add')
+
+        if self.path == '/ru/jungle/publish':
+            content_id = int(fields['content_id'])
+            services.publish(content_id)
+            return self._redirect('/ru/jungle/content/{}'.format(content_id))
+
+        self._send(404, 'Not found')
+
+    def _read_form(self):
+        """Return fields of urlencoded or multipart form."""
+        content_type = self.headers.get('content-type', '')
+        if content_type.startswith('multipart/form-data'):
+            form = cgi.FieldStorage(fp=self.rfile, headers=self.headers, environ=dict(
+                REQUEST_METHOD='POST',
+                CONTENT_TYPE=content_type
+            ))
+            return dict((key, form[key].value) for key in form.keys())
+
+        body = self.rfile.read(int(self.headers.get('content-length', 0)))
+        return dict(urlparse.parse_qsl(body))
+
+    def _is_signed_in(self):
+        return '{}='.format(SESSION_COOKIE) in self.headers.get('cookie', '')
+
+    def _send_json(self, data):
+        self._send(200, json.dumps(data), content_type='application/json; charset=UTF-8')
+
+    def _redirect(self, location, cookie=None):
+        headers = [('Location', location)]
+        if cookie:
+            headers.append(('Set-Cookie', '{}; Path=/'.format(cookie)))
+        self._send(302, '', headers=headers)
+
+    def _send(self, status, body, content_type='text/html; charset=utf-8', headers=()):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
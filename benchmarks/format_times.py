@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+"""Micro-benchmark of SRT time formatting.
+
+Batched formatting of integer milliseconds is compared with
+the legacy per-stamp formatting of float seconds:
+
+    $ python benchmarks/format_times.py --stamps 200000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import leo.xml2srt as xml2srt
+from xml2srt import _legacy_format_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark SRT time formatting.')
+    parser.add_argument(
+        '--stamps',
+        metavar='N',
+        type=int,
+        default=200000,
+        help='Number of formatted times (200000 is default)'
+    )
+    parser.add_argument(
+        '--repeat',
+        metavar='N',
+        type=int,
+        default=3,
+        help='Number of runs, the best one is reported (3 is default)'
+    )
+    args = parser.parse_args()
+
+    generator = random.Random(0)
+    millisecs = [generator.randint(0, 4 * 3600 * 1000) for _ in range(args.stamps)]
+    seconds = [value / 1000.0 for value in millisecs]
+
+    def legacy():
+        return [_legacy_format_time(value) for value in seconds]
+
+    def batched():
+        formatted = []
+        for i in range(0, len(millisecs), xml2srt.CHUNK_SIZE):
+            formatted.extend(xml2srt.format_times(millisecs[i:i + xml2srt.CHUNK_SIZE]))
+        return formatted
+
+    legacy_seconds = _best_time(legacy, args.repeat)
+    batched_seconds = _best_time(batched, args.repeat)
+
+    print '{} stamps: legacy {:.3f}s, batched {:.3f}s ({:.1f}x)'.format(
+        args.stamps, legacy_seconds, batched_seconds, legacy_seconds / batched_seconds
+    )
+
+
+def _best_time(func, repeat):
+    """Return the shortest duration of func call in seconds."""
+    durations = []
+    for _ in range(repeat):
+        start_time = time.time()
+        func()
+        durations.append(time.time() - start_time)
+    return min(durations)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmark of Selenium uploads with resource blocking on and off.
+
+The same videos are submitted and published through headless Chrome
+against fake LinguaLeo, once with 'block_resources' and once without.
+Seconds per upload are reported, and with --measure-page-loads
+average load time and size of the pages too:
+
+    $ python benchmarks/page_loads.py --uploads 20 --measure-page-loads
+
+Chrome and chromedriver have to be installed.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import leo.backends as backends
+from fake_services import FakeServices, Options, video_id
+
+# Maximum number of Publish attempts of every video.
+PUBLISH_ATTEMPTS = 10
+
+
+def main():
+    args = _get_parser().parse_args()
+
+    services = FakeServices(Options(leo_latency=args.leo_latency / 1000.0))
+    services.start()
+    backends.HOME_URL = services.url + '/ru/'
+    backends.LOGIN_URL = services.url + '/ru/login'
+    backends.ADD_CONTENT_URL = services.url + '/ru/jungle/add'
+
+    directory = tempfile.mkdtemp(prefix='leo-benchmark-')
+    subtitles_filename = os.path.join(directory, 'subtitles.srt')
+    with open(subtitles_filename, 'w') as outfile:
+        outfile.write('1\n00:00:01,000 --> 00:00:03,000\nHello\n')
+
+    print '{:>8} {:>8} {:>10} {:>12} {:>10}'.format(
+        'blocking', 'uploads', 's/upload', 'page load s', 'page KB'
+    )
+    try:
+        for block_resources in (False, True):
+            services.reset()
+            result = run_uploads(dict(headless=True,
+                                      block_resources=block_resources,
+                                      measure_page_loads=args.measure_page_loads),
+                                 services, args.uploads, subtitles_filename)
+            print '{:>8} {:>8} {:>10.3f} {:>12} {:>10}'.format(
+                'on' if block_resources else 'off', result['published'],
+                result['seconds'] / args.uploads, result['page_load'], result['page_kb']
+            )
+    finally:
+        shutil.rmtree(directory)
+        services.stop()
+
+
+def run_uploads(settings, services, uploads, subtitles_filename):
+    """Submit and publish videos with a new Chrome.
+
+    Args:
+        settings (dict): browser settings of the backend.
+        services (FakeServices): running fake services.
+        uploads (int): number of videos to upload.
+        subtitles_filename (str): subtitles of every video.
+
+    Returns:
+        dict: results of the run.
+    """
+    backend = backends.SeleniumBackend(settings)
+    try:
+        backend.sign_in('benchmark@example.com', services.options.password)
+
+        start_time = time.time()
+        for index in range(uploads):
+            publish_url = backend.submit(
+                'https://www.youtube.com/watch?v={}'.format(video_id(0, index)),
+                'Video {}'.format(index),
+                subtitles_filename
+            )
+            for attempt in range(PUBLISH_ATTEMPTS):
+                if backend.publish(publish_url, attempt > 0):
+                    break
+        seconds = time.time() - start_time
+
+        page_loads = backend.get_page_loads()
+    finally:
+        backend.close()
+
+    result = dict(published=len(services.published), seconds=seconds,
+                  page_load='-', page_kb='-')
+    if page_loads:
+        result['page_load'] = '{:.3f}'.format(
+            sum(load_seconds for load_seconds, _ in page_loads) / len(page_loads)
+        )
+        result['page_kb'] = '{:.1f}'.format(
+            sum(transferred for _, transferred in page_loads) / 1024.0 / len(page_loads)
+        )
+    return result
+
+
+def _get_parser():
+    parser = argparse.ArgumentParser(
+        description='Compare Selenium uploads with resource blocking on and off.'
+    )
+
+    parser.add_argument(
+        '--uploads',
+        metavar='N',
+        type=int,
+        default=20,
+        help='Number of uploaded videos in every mode (20 is default)'
+    )
+
+    parser.add_argument(
+        '--leo-latency',
+        metavar='MS',
+        type=float,
+        default=20,
+        help='Latency of LinguaLeo in milliseconds (20 is default)'
+    )
+
+    parser.add_argument(
+        '--measure-page-loads',
+        action='store_true',
+        help='Also report average load time and size of the pages'
+    )
+
+    return parser
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmark of leo startup time.
+
+Import of leo.main and subcommands, which do not upload anything,
+are timed in a new Python process, so module imports are included:
+
+    $ python benchmarks/startup.py --repeat 10
+
+HOME of the processes is a temporary directory, so the default config
+and caches of the user are not touched.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+RUN_LEO = 'import sys; import leo.main; sys.argv[0] = "leo"; leo.main.main()'
+
+
+def main():
+    args = _get_parser().parse_args()
+
+    directory = tempfile.mkdtemp(prefix='leo-benchmark-')
+    config_filename = _write_config(directory)
+    commands = [
+        ('import leo.main', ['-c', 'import leo.main']),
+        ('--clear-extra', ['-c', RUN_LEO, '--config', config_filename, '--clear-extra']),
+        ('--set-default-config', ['-c', RUN_LEO, '--set-default-config', config_filename]),
+        ('--retry-status', ['-c', RUN_LEO, '--config', config_filename, '--retry-status']),
+    ]
+
+    print '{:<22} {:>8} {:>8} {:>8}'.format('command', 'min s', 'median s', 'max s')
+    try:
+        for name, argv in commands:
+            seconds = sorted(run(argv, directory) for _ in range(args.repeat))
+            print '{:<22} {:>8.3f} {:>8.3f} {:>8.3f}'.format(
+                name, seconds[0], seconds[len(seconds) // 2], seconds[-1]
+            )
+    finally:
+        shutil.rmtree(directory)
+
+
+def run(argv, directory):
+    """Run Python process and return its duration in seconds.
+
+    Args:
+        argv (list): arguments of the interpreter.
+        directory (str): working and home directory of the process.
+
+    Returns:
+        float: wall time of the process.
+    """
+    env = dict(os.environ, HOME=directory,
+               PYTHONPATH=os.pathsep.join([ROOT_DIR, os.environ.get('PYTHONPATH', '')]))
+
+    start_time = time.time()
+    with open(os.devnull, 'w') as devnull:
+        subprocess.check_call([sys.executable] + argv, cwd=directory, env=env,
+                              stdout=devnull)
+    return time.time() - start_time
+
+
+def _write_config(directory):
+    """Write config with state database and caches in the directory.
+
+    Returns:
+        str: name of the config file.
+    """
+    config = dict(
+        email='benchmark@example.com',
+        password='password',
+        api_key='benchmark',
+        state_db=os.path.join(directory, 'config.db'),
+        settings=dict(
+            subtitle_cache=dict(directory=os.path.join(directory, 'subtitles')),
+            youtube=dict(response_cache=''),
+            browser=dict(cookies_file='')
+        )
+    )
+
+    config_filename = os.path.join(directory, 'config.json')
+    with open(config_filename, 'w') as outfile:
+        json.dump(config, outfile)
+    return config_filename
+
+
+def _get_parser():
+    parser = argparse.ArgumentParser(
+        description='Time import of leo and subcommands without uploads.'
+    )
+
+    parser.add_argument(
+        '--repeat',
+        metavar='N',
+        type=int,
+        default=10,
+        help='Number of runs of every command (10 is default)'
+    )
+
+    return parser
+
+
+if __name__ == '__main__':
+    main()
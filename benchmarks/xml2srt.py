@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmark of XML to SRT conversion against the legacy converter.
+
+The legacy converter, which parsed the whole document with BeautifulSoup,
+is kept here as a reference for speed and output:
+
+    $ python benchmarks/xml2srt.py --captions 10000 100000
+"""
+
+import argparse
+import os
+import sys
+import time
+from HTMLParser import HTMLParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import leo.xml2srt as xml2srt
+
+
+def generate(captions):
+    """Return synthetic timedtext XML.
+
+    Captions do not overlap and have times with at most millisecond
+    precision, so the legacy converter formats them correctly.
+    Text contains escaped entities and non-ASCII characters,
+    double-escaped like in timedtext responses.
+
+    Args:
+        captions (int): number of captions.
+
+    Returns:
+        str: UTF-8 encoded XML.
+    """
+    texts = []
+    for i in range(captions):
+        texts.append(
+            u'<text start="{:.3f}" dur="1.75">Caption {} &amp;#39;quoted&amp;#39; '
+            u'&amp;amp; привет</text>'.format(i * 2.5 + 0.125, i)
+        )
+    return (u'<?xml version="1.0" encoding="utf-8" ?><transcript>{}</transcript>'
+            .format(u''.join(texts)).encode('utf-8'))
+
+
+def legacy_convert(xml_text):
+    """Convert timedtext XML to SRT the way it was done with BeautifulSoup.
+
+    Args:
+        xml_text (str): UTF-8 encoded subtitles in XML format.
+
+    Returns:
+        unicode: subtitles in SRT format.
+    """
+    from bs4 import BeautifulSoup
+
+    xml_text = HTMLParser().unescape(xml_text.decode('utf-8'))
+    soup = BeautifulSoup(xml_text, 'html.parser')
+
+    lines = []
+    for i, caption in enumerate(soup.find_all('text')):
+        start_time = float(caption['start'])
+        end_time = start_time + float(caption['dur'])
+        lines.append(str(i + 1))
+        lines.append(_legacy_format_time(start_time) + ' --> ' + _legacy_format_time(end_time))
+        lines.append(caption.text)
+        lines.append('')
+
+    return '\n'.join(lines)
+
+
+def _legacy_format_time(seconds):
+    """Format time to SRT standart, e.g. 00:00:00,000."""
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    seconds, millisecs = divmod(seconds, 1)
+
+    return '{:02d}:{:02d}:{:02d},{:03d}'.format(int(round(hours)), int(round(minutes)),
+                                                int(round(seconds)),
+                                                int(round(millisecs * 1000)))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare XML to SRT conversion with the legacy converter.'
+    )
+    parser.add_argument(
+        '--captions',
+        metavar='N',
+        type=int,
+        nargs='+',
+        default=[10000, 100000],
+        help='Numbers of captions in generated subtitles (10000 100000 is default)'
+    )
+    args = parser.parse_args()
+
+    print '{:>9} {:>10} {:>10} {:>8} {:>9}'.format(
+        'captions', 'legacy s', 'stream s', 'speedup', 'identical'
+    )
+    for captions in args.captions:
+        xml_text = generate(captions)
+
+        start_time = time.time()
+        legacy = legacy_convert(xml_text)
+        legacy_seconds = time.time() - start_time
+
+        start_time = time.time()
+        converted = xml2srt.convert(xml_text)
+        seconds = time.time() - start_time
+
+        print '{:>9} {:>10.3f} {:>10.3f} {:>7.1f}x {:>9}'.format(
+            captions, legacy_seconds, seconds, legacy_seconds / seconds, str(converted == legacy)
+        )
+
+
+if __name__ == '__main__':
+    main()
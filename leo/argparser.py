@@ -13,7 +13,17 @@ def get_parser():
         metavar='VIDEO_URL',
         nargs='+',
         default=[],
-        help='URLs to YouTube videos'
+        help='URLs to YouTube videos and playlists'
+    )
+
+    parser.add_argument(
+        '--extra-file',
+        dest='extra_files',
+        metavar='FILE',
+        nargs='+',
+        default=[],
+        help='Files with URLs to YouTube videos and playlists, one per line '
+             '(- reads standard input)'
     )
 
     parser.add_argument(
@@ -50,4 +60,72 @@ def get_parser():
         help='Clear extra videos from config'
     )
 
+    parser.add_argument(
+        '--daemon',
+        action='store_true',
+        help='Keep running, polling every channel as often as it publishes videos'
+    )
+
+    parser.add_argument(
+        '--retry-status',
+        action='store_true',
+        help='Show videos which are going to be retried'
+    )
+
+    parser.add_argument(
+        '--rebuild-index',
+        action='store_true',
+        help='Add videos from LinguaLeo content list to the index of uploaded videos'
+    )
+
+    parser.add_argument(
+        '--profile',
+        metavar='DIRECTORY',
+        nargs='?',
+        const='profile',
+        help='Write cProfile statistics of every phase of the run '
+             'to .pstats files (profile is default directory)'
+    )
+
+    parser.add_argument(
+        '--profile-memory',
+        action='store_true',
+        help='With --profile, trace memory allocated by subtitle conversion '
+             'and report lines which allocate most (requires tracemalloc)'
+    )
+
+    parser.add_argument(
+        '--poll-workers',
+        metavar='N',
+        type=int,
+        default=1,
+        help='Number of channels polled concurrently (1 is default)'
+    )
+
+    parser.add_argument(
+        '--prefetch-workers',
+        metavar='N',
+        type=int,
+        default=2,
+        help='Number of threads downloading subtitles ahead of uploads '
+             '(2 is default, 0 disables prefetching)'
+    )
+
+    parser.add_argument(
+        '--upload-workers',
+        metavar='N',
+        type=int,
+        default=1,
+        help='Number of videos uploaded concurrently, each one by its own '
+             'signed in backend (1 is default)'
+    )
+
+    parser.add_argument(
+        '--backend',
+        choices=['selenium', 'http'],
+        default='selenium',
+        help='How to add content to LinguaLeo: drive Chrome or post forms '
+             'directly (selenium is default)'
+    )
+
     return parser
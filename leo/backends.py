@@ -0,0 +1,473 @@
+# -*- coding: utf-8 -*-
+
+"""Backends which add content to LinguaLeo."""
+
+from HTMLParser import HTMLParser
+import os
+import urlparse
+
+import requests
+from selenium import webdriver
+from selenium.webdriver.common.keys import Keys
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support.ui import WebDriverWait
+
+HOME_URL = 'http://lingualeo.com/ru/'
+LOGIN_URL = 'http://lingualeo.com/ru/login'
+ADD_CONTENT_URL = 'http://lingualeo.com/ru/jungle/add'
+
+# Value of 'Educational video' option of genre select.
+EDUCATIONAL_GENRE_ID = '10'
+
+# Hosts which serve everything LinguaLeo forms need.
+DEFAULT_ALLOWED_HOSTS = ['lingualeo.com', '*.lingualeo.com']
+
+# Chrome content settings which block images, plugins, popups
+# and notifications (2 means 'block').
+BLOCKING_PREFS = {
+    'profile.managed_default_content_settings.images': 2,
+    'profile.managed_default_content_settings.plugins': 2,
+    'profile.managed_default_content_settings.popups': 2,
+    'profile.managed_default_content_settings.notifications': 2,
+}
+
+# Returns duration of the page load in milliseconds
+# and number of bytes transferred for the page and its resources.
+PAGE_LOAD_SCRIPT = """
+var timing = window.performance.timing;
+var entries = window.performance.getEntriesByType('navigation')
+    .concat(window.performance.getEntriesByType('resource'));
+var bytes = 0;
+for (var i = 0; i < entries.length; i++) {
+    bytes += entries[i].transferSize || 0;
+}
+return [Math.max(timing.loadEventEnd - timing.navigationStart, 0), bytes];
+"""
+
+
+class CredentialsError(Exception):
+    """Error with email or password."""
+    pass
+
+
+class Backend(object):
+    """Interface of LinguaLeo backend.
+
+    Content is added in two steps. At first, 'Add content' form is
+    submitted, which redirects to the Publish page. Then content is
+    published from that page, which can be impossible for some time
+    while the video is processing.
+    """
+
+    def sign_in(self, email, password):
+        """Authorize to LinguaLeo site.
+
+        Args:
+            email (str): LinguaLeo email.
+            password (str): LinguaLeo password.
+
+        Raises:
+            CredentialsError: if email and/or password is invalid.
+        """
+        raise NotImplementedError
+
+    def is_signed_in(self):
+        """Check if current session is authorized.
+
+        Returns:
+            bool: True, if LinguaLeo does not redirect to sign in page.
+                False, otherwise.
+        """
+        raise NotImplementedError
+
+    def get_cookies(self):
+        """Return cookies of the session.
+
+        Returns:
+            list: dicts with 'name', 'value', 'domain', 'path',
+                'secure' and optional 'expiry' keys.
+        """
+        raise NotImplementedError
+
+    def set_cookies(self, cookies):
+        """Restore session from cookies returned by get_cookies().
+
+        Args:
+            cookies (list): dicts with cookies.
+        """
+        raise NotImplementedError
+
+    def get_page(self, url):
+        """Load page of the signed in user.
+
+        Args:
+            url (str): URL of the page.
+
+        Returns:
+            tuple: URL after redirects and HTML of the page.
+        """
+        raise NotImplementedError
+
+    def submit(self, video_url, title, subtitles_filename):
+        """Fill 'Add content' form and submit it.
+
+        Args:
+            video_url (str): URL of the YouTube video.
+            title (str): name of the content.
+            subtitles_filename (str): absolute path to the SRT file.
+
+        Returns:
+            str: URL of the Publish page.
+        """
+        raise NotImplementedError
+
+    def publish(self, publish_url, refresh):
+        """Try to publish submitted content.
+
+        Args:
+            publish_url (str): URL returned by submit().
+            refresh (bool): True, if page should be reloaded
+                after the previous attempt.
+
+        Returns:
+            str: URL of the published content,
+                None if video is still processing.
+
+        Raises:
+            AttributeError: if form was not accepted.
+        """
+        raise NotImplementedError
+
+    def get_page_loads(self):
+        """Return statistics of the loaded pages.
+
+        Returns:
+            list: pairs of load duration in seconds and transferred bytes.
+        """
+        return []
+
+    def close(self):
+        """Release resources of the backend."""
+        pass
+
+
+class SeleniumBackend(Backend):
+    """Drives Chrome through the LinguaLeo pages."""
+
+    # Seconds to wait for Publish button on the loaded page.
+    PUBLISH_WAIT = 5
+
+    def __init__(self, settings=None, worker=0):
+        """Initialize SeleniumBackend object.
+        Launch Chrome.
+
+        Args:
+            settings (dict): object with optional 'headless' (bool),
+                'user_data_dir' (str), 'block_resources' (bool),
+                'allowed_hosts' (list) and 'measure_page_loads' (bool) keys.
+            worker (int): index of the backend among concurrent ones.
+                Chrome profile cannot be shared, so every next worker
+                gets profile directory with its index as a suffix.
+        """
+        settings = settings or {}
+        options = webdriver.ChromeOptions()
+        self.page_loads = []
+        # Statistics are read by a blocking script after every page load,
+        # so they are collected only on demand.
+        self.measure_page_loads = settings.get('measure_page_loads', False)
+
+        if settings.get('headless'):
+            options.add_argument('--headless')
+            options.add_argument('--disable-gpu')
+            options.add_argument('--window-size=1920,1080')
+
+        if settings.get('user_data_dir'):
+            user_data_dir = os.path.expanduser(settings['user_data_dir'])
+            if worker:
+                user_data_dir += '-{}'.format(worker)
+            options.add_argument('--user-data-dir={}'.format(user_data_dir))
+
+        # Forms need only HTML and scripts from LinguaLeo hosts.
+        # Requests to other hosts (ads, analytics, fonts, CDNs of images)
+        # fail on DNS resolution without reaching the network.
+        if settings.get('block_resources'):
+            options.add_experimental_option('prefs', BLOCKING_PREFS)
+            allowed_hosts = settings.get('allowed_hosts', DEFAULT_ALLOWED_HOSTS)
+            options.add_argument('--host-resolver-rules=MAP * ~NOTFOUND, {}'.format(
+                ', '.join('EXCLUDE {}'.format(host)
+                          for host in allowed_hosts + ['localhost'])
+            ))
+
+        self.driver = webdriver.Chrome(chrome_options=options)
+
+        if not settings.get('headless'):
+            self.driver.maximize_window()
+
+    def sign_in(self, email, password):
+        self.driver.get(LOGIN_URL)
+        self.driver.find_element_by_name('email').send_keys(email)
+        password_field = self.driver.find_element_by_name('password')
+        password_field.send_keys(password)
+        password_field.send_keys(Keys.RETURN)
+        if self.driver.current_url == LOGIN_URL:
+            raise CredentialsError('Invalid email and/or password')
+
+    def is_signed_in(self):
+        self.driver.get(ADD_CONTENT_URL)
+        return not self.driver.current_url.startswith(LOGIN_URL)
+
+    def get_cookies(self):
+        return self.driver.get_cookies()
+
+    def set_cookies(self, cookies):
+        # Cookies can be added only for the domain of the current page.
+        self.driver.get(HOME_URL)
+        for cookie in cookies:
+            self.driver.add_cookie(cookie)
+
+    def get_page(self, url):
+        self._load(url)
+        return self.driver.current_url, self.driver.page_source
+
+    def submit(self, video_url, title, subtitles_filename):
+        self._load(ADD_CONTENT_URL)
+
+        # Insert video link.
+        self.driver.find_element_by_name('content_embed').send_keys(video_url)
+
+        # Insert video name.
+        self.driver.find_element_by_name('content_name').send_keys(title)
+
+        # Insert path to the subtitles.
+        self.driver.find_element_by_name('content_srt').send_keys(subtitles_filename)
+
+        # Select 'Educational video' genre.
+        self.driver.find_element_by_css_selector(
+            '#genre_id > option[value="{}"]'.format(EDUCATIONAL_GENRE_ID)
+        ).click()
+
+        # Submit whole form, which will redirect to Publish page.
+        self.driver.find_element_by_id('addContentForm').submit()
+        self._record_page_load()
+
+        return self.driver.current_url
+
+    def publish(self, publish_url, refresh):
+        if refresh or self.driver.current_url != publish_url:
+            self._load(publish_url)
+
+        # If Publish button does not appear, there could be 2 reasons:
+        # - invalid input (error);
+        # - video is processing (try again later).
+        try:
+            buttons = WebDriverWait(self.driver, self.PUBLISH_WAIT).until(
+                lambda driver: (driver.find_elements_by_id('publicContentBtn') or
+                                driver.current_url == ADD_CONTENT_URL)
+            )
+        except TimeoutException:
+            return None
+
+        if buttons is True:
+            raise AttributeError('Cannot submit form. '
+                                 'Probably name is incorrect')
+
+        buttons[0].click()
+        return self.driver.current_url
+
+    def get_page_loads(self):
+        return self.page_loads
+
+    def close(self):
+        self.driver.quit()
+
+    def _load(self, url):
+        """Load page and record its statistics."""
+        self.driver.get(url)
+        self._record_page_load()
+
+    def _record_page_load(self):
+        """Record load duration and transferred bytes of the current page."""
+        if not self.measure_page_loads:
+            return
+
+        milliseconds, transferred = self.driver.execute_script(PAGE_LOAD_SCRIPT)
+        self.page_loads.append((milliseconds / 1000.0, transferred))
+
+
+class HttpBackend(Backend):
+    """Posts LinguaLeo forms directly over HTTP session.
+
+    Requests are sent through one requests.Session, which keeps
+    the sign-in cookie and pools connections.
+    """
+
+    TIMEOUT = 60
+
+    def __init__(self, settings=None, worker=0):
+        """Initialize HttpBackend object.
+
+        Args:
+            settings (dict): browser settings, which are not used.
+            worker (int): index of the backend among concurrent ones.
+        """
+        self.session = requests.Session()
+
+    def sign_in(self, email, password):
+        response = self._request('post', LOGIN_URL, data=dict(
+            email=email,
+            password=password
+        ))
+        if response.url == LOGIN_URL:
+            raise CredentialsError('Invalid email and/or password')
+
+    def is_signed_in(self):
+        return not self._request('get', ADD_CONTENT_URL).url.startswith(LOGIN_URL)
+
+    def get_cookies(self):
+        cookies = []
+        for cookie in self.session.cookies:
+            cookie_dict = dict(
+                name=cookie.name,
+                value=cookie.value,
+                domain=cookie.domain,
+                path=cookie.path,
+                secure=cookie.secure
+            )
+            if cookie.expires:
+                cookie_dict['expiry'] = cookie.expires
+            cookies.append(cookie_dict)
+        return cookies
+
+    def set_cookies(self, cookies):
+        for cookie in cookies:
+            self.session.cookies.set(
+                cookie['name'],
+                cookie['value'],
+                domain=cookie.get('domain'),
+                path=cookie.get('path', '/'),
+                secure=cookie.get('secure', False),
+                expires=cookie.get('expiry')
+            )
+
+    def get_page(self, url):
+        response = self._request('get', url)
+        return response.url, response.text
+
+    def submit(self, video_url, title, subtitles_filename):
+        page = self._request('get', ADD_CONTENT_URL)
+        action = _find_action(page, 'addContentForm')
+        if action is None:
+            raise AttributeError('Cannot find "Add content" form')
+
+        method, url, fields = action
+        fields.update(
+            content_embed=video_url,
+            content_name=title,
+            genre_id=EDUCATIONAL_GENRE_ID
+        )
+
+        with open(subtitles_filename, 'rb') as srt_file:
+            response = self._request(method, url, data=fields, files=dict(
+                content_srt=(os.path.basename(subtitles_filename), srt_file)
+            ))
+
+        return response.url
+
+    def publish(self, publish_url, refresh):
+        page = self._request('get', publish_url)
+
+        # If Publish button does not exist, there could be 2 reasons:
+        # - invalid input (error);
+        # - video is processing (try again later).
+        action = _find_action(page, 'publicContentBtn')
+        if action is None:
+            if page.url == ADD_CONTENT_URL:
+                raise AttributeError('Cannot submit form. '
+                                     'Probably name is incorrect')
+            return None
+
+        method, url, fields = action
+        return self._request(method, url, data=fields).url
+
+    def close(self):
+        self.session.close()
+
+    def _request(self, method, url, **kwargs):
+        """Send request and check response status.
+
+        Raises:
+            requests.RequestException: if request failed.
+        """
+        response = self.session.request(method, url, timeout=self.TIMEOUT, **kwargs)
+        response.raise_for_status()
+        return response
+
+
+BACKENDS = dict(
+    selenium=SeleniumBackend,
+    http=HttpBackend
+)
+
+
+def _find_action(response, element_id):
+    """Find request which is sent by clicking the element of the page.
+
+    Args:
+        response (requests.Response): HTML page.
+        element_id (str): ID of the form, of the element inside the form
+            or of the link.
+
+    Returns:
+        tuple: HTTP method, absolute URL and dict with form fields.
+            None, if element is not found.
+    """
+    parser = _ActionParser(element_id)
+    parser.feed(response.text)
+    parser.close()
+
+    if parser.action is None:
+        return None
+
+    method, url, fields = parser.action
+    return method, urlparse.urljoin(response.url, url), fields
+
+
+class _ActionParser(HTMLParser):
+    """Extracts request which is sent by clicking an element."""
+
+    def __init__(self, element_id):
+        HTMLParser.__init__(self)
+        self.element_id = element_id
+        self.action = None
+        self._form = None
+        self._form_has_element = False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+
+        if tag == 'form':
+            self._form = ('post' if attrs.get('method', 'get').lower() == 'post' else 'get',
+                          attrs.get('action', ''), {})
+            self._form_has_element = attrs.get('id') == self.element_id
+            return
+
+        if attrs.get('id') == self.element_id:
+            if self._form is not None:
+                self._form_has_element = True
+                # Submit button sends its own value too.
+                if attrs.get('name'):
+                    self._form[2][attrs['name']] = attrs.get('value', '')
+            elif tag == 'a' and self.action is None:
+                self.action = ('get', attrs.get('href', ''), {})
+
+        # Hidden fields carry tokens and IDs of the content.
+        if (self._form is not None and tag == 'input' and
+                attrs.get('type') == 'hidden' and attrs.get('name')):
+            self._form[2][attrs['name']] = attrs.get('value', '')
+
+    def handle_endtag(self, tag):
+        if tag == 'form' and self._form is not None:
+            if self._form_has_element and self.action is None:
+                self.action = self._form
+            self._form = None
+            self._form_has_element = False
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+
+"""Long-running mode, which polls every channel on its own schedule."""
+
+import datetime
+import heapq
+import itertools
+import Queue
+import signal
+import socket
+import threading
+import time
+
+from httplib2 import HttpLib2Error
+from requests import RequestException
+from selenium.common.exceptions import TimeoutException
+
+from leo.quota import DEFAULT_POSTING_PERIOD, posting_period_start, schedule_channels
+from leo.util import DAY, HOUR, MINUTE
+
+# Channel is polled this number of times between its expected uploads.
+POLLS_PER_UPLOAD = 4
+
+# Kinds of timers and work items.
+POLL = 'poll'
+RETRY = 'retry'
+UPLOAD = 'upload'
+
+
+def poll_interval(publication_count, min_interval, max_interval):
+    """Return number of seconds until the next poll of the channel.
+
+    Args:
+        publication_count (int): number of videos published by the channel
+            during the last DEFAULT_POSTING_PERIOD days.
+        min_interval (int): minimum number of seconds between polls.
+        max_interval (int): maximum number of seconds between polls.
+
+    Returns:
+        float: number of seconds.
+    """
+    expected_gap = DEFAULT_POSTING_PERIOD * DAY / (publication_count + 1.0)
+    return min(max(expected_gap / POLLS_PER_UPLOAD, min_interval), max_interval)
+
+
+class Daemon(object):
+    """Keeps API client and signed in backends between polls.
+
+    Main thread waits for the nearest timer in the heap and polls channels
+    when they are due. Found videos are put to a single work queue,
+    which is processed by the upload thread one item after another.
+    Failed and pending videos are retried by timer too.
+
+    SIGTERM and SIGINT stop daemon after the videos being uploaded.
+    """
+
+    def __init__(self, leo_uploader, upload_workers=1, prefetch_workers=2,
+                 min_interval=15 * MINUTE, max_interval=DAY, retry_interval=HOUR):
+        """Initialize Daemon object.
+
+        Args:
+            leo_uploader (LeoUploader): uploader with loaded config.
+            upload_workers (int): number of backends which upload concurrently.
+            prefetch_workers (int): number of threads which download subtitles.
+            min_interval (int): minimum number of seconds between polls of a channel.
+            max_interval (int): maximum number of seconds between polls of a channel.
+            retry_interval (int): number of seconds between retries
+                of failed and pending videos.
+        """
+        self.leo_uploader = leo_uploader
+        self.upload_workers = upload_workers
+        self.prefetch_workers = prefetch_workers
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.retry_interval = retry_interval
+
+        self.stop_event = leo_uploader.stop_event
+        self.timers = []
+        self.work = Queue.Queue()
+        # IDs of the channels which have videos in the work queue.
+        # They are not polled until the videos are finished.
+        self.busy_channels = set()
+        self._counter = itertools.count()
+        self._busy_lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, leo_uploader, settings, upload_workers=1, prefetch_workers=2):
+        """Create daemon from 'daemon' settings of the config.
+
+        Args:
+            leo_uploader (LeoUploader): uploader with loaded config.
+            settings (dict): object with optional 'min_interval_minutes',
+                'max_interval_hours' and 'retry_interval_minutes' keys.
+            upload_workers (int): number of backends which upload concurrently.
+            prefetch_workers (int): number of threads which download subtitles.
+
+        Returns:
+            Daemon: new daemon.
+        """
+        return cls(
+            leo_uploader,
+            upload_workers=upload_workers,
+            prefetch_workers=prefetch_workers,
+            min_interval=settings.get('min_interval_minutes', 15) * MINUTE,
+            max_interval=settings.get('max_interval_hours', 24) * HOUR,
+            retry_interval=settings.get('retry_interval_minutes', 60) * MINUTE
+        )
+
+    def run(self):
+        """Poll and upload until stopped by signal.
+
+        Must be called from the main thread.
+
+        Raises:
+            CredentialsError: if email and/or password is invalid.
+        """
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: self.stop())
+
+        self.leo_uploader.sign_in(self.upload_workers)
+
+        now = time.time()
+        channels, deferred = schedule_channels(self.leo_uploader.channels,
+                                               self.leo_uploader.quota,
+                                               self._get_publication_counts())
+        for channel in channels:
+            self._add_timer(now, POLL, channel)
+        for channel in deferred:
+            self._add_timer(now + self.retry_interval, POLL, channel)
+        self._add_timer(now, RETRY)
+
+        uploader = threading.Thread(target=self._upload_worker)
+        uploader.start()
+
+        self._log('Started, {} channel(s)'.format(len(self.leo_uploader.channels)))
+        try:
+            self._run_timers()
+        finally:
+            self.stop()
+            # Wake up upload thread, if it waits for work.
+            self.work.put(None)
+            self._log('Stopping after current uploads...')
+            # Join with timeout to keep main thread interruptible.
+            while uploader.is_alive():
+                uploader.join(1)
+            self.leo_uploader.write_metrics()
+            self._log('Stopped')
+
+    def stop(self):
+        """Stop polling and uploading.
+
+        It is safe to call from signal handler.
+        """
+        self.stop_event.set()
+
+    def _run_timers(self):
+        """Fire timers when they are due until stop."""
+        while not self.stop_event.is_set():
+            due_time, _, kind, channel = self.timers[0]
+            delay = due_time - time.time()
+            if delay > 0:
+                self.stop_event.wait(delay)
+                continue
+
+            heapq.heappop(self.timers)
+            if kind == RETRY:
+                self.work.put((RETRY, None, None))
+                self._add_timer(time.time() + self.retry_interval, RETRY)
+            else:
+                self._add_timer(time.time() + self._poll(channel), POLL, channel)
+
+    def _poll(self, channel):
+        """Poll channel and queue its new videos.
+
+        Args:
+            channel (dict): object with channel 'id' and 'name' keys.
+
+        Returns:
+            float: number of seconds until the next poll.
+        """
+        with self._busy_lock:
+            if channel['id'] in self.busy_channels:
+                return self.min_interval
+
+        try:
+            new_videos = self.leo_uploader.poll_channel(channel)
+        except (HttpLib2Error, socket.error) as exception:
+            self._log('Cannot get videos from channel "{}" ({})'.format(channel['name'],
+                                                                       exception))
+            return self.min_interval
+
+        if channel.get('deferred'):
+            self._log('Deferred {} (YouTube API quota)'.format(channel['name']))
+            return self.retry_interval
+
+        if new_videos is None:
+            self._log('Cannot get videos from channel "{}"'.format(channel['name']))
+        elif new_videos:
+            self._log('{}: {} new video(s)'.format(channel['name'], len(new_videos)))
+            with self._busy_lock:
+                self.busy_channels.add(channel['id'])
+            self.work.put((UPLOAD, channel, new_videos))
+
+        return poll_interval(self._get_publication_counts().get(channel['id'], 0),
+                             self.min_interval, self.max_interval)
+
+    def _upload_worker(self):
+        """Process work queue until stop.
+
+        Session of the backends is checked before every work item.
+        Errors of a work item are logged, and the next item is processed.
+        """
+        while True:
+            item = self.work.get()
+            if item is None or self.stop_event.is_set():
+                return
+
+            kind, channel, new_videos = item
+            try:
+                # Session expires in a long run. Videos are not uploaded
+                # without it, so they are not recorded as rejected.
+                if self.leo_uploader.ensure_signed_in():
+                    self._log('Session expired, signed in again')
+
+                if kind == UPLOAD:
+                    jobs = [(video, channel) for video in
+                            sorted(new_videos, key=lambda x: x['published_at'])]
+                    self.leo_uploader.upload_new_videos(jobs, self.prefetch_workers)
+                else:
+                    self._retry_videos()
+            except (TimeoutException, HttpLib2Error, RequestException, socket.error) as exception:
+                self._log('Network error: {}'.format(exception))
+            except Exception as exception:
+                # Upload thread is the only one, so it must outlive
+                # any error of a single work item (browser, disk, database).
+                self._log('Unexpected error: {}: {}'.format(type(exception).__name__,
+                                                            exception))
+            finally:
+                if channel:
+                    with self._busy_lock:
+                        self.busy_channels.discard(channel['id'])
+                self.leo_uploader.write_metrics()
+
+    def _retry_videos(self):
+        """Upload failed videos which can be retried and publish pending ones."""
+        self.leo_uploader.reload_retry_queue()
+        if self.leo_uploader.extra_videos:
+            self.leo_uploader.add_extra_videos(self.prefetch_workers)
+        if self.leo_uploader.pending_videos:
+            self.leo_uploader.add_pending_videos()
+
+    def _add_timer(self, due_time, kind, channel=None):
+        """Schedule poll of the channel or retry of the videos."""
+        # Counter keeps timers with equal times in order of addition.
+        heapq.heappush(self.timers, (due_time, next(self._counter), kind, channel))
+
+    def _get_publication_counts(self):
+        """Return number of recently published videos of every channel."""
+        return self.leo_uploader.store.get_publication_counts(posting_period_start())
+
+    @staticmethod
+    def _log(message):
+        """Print message with current time."""
+        print '[{}] {}'.format(datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'), message)
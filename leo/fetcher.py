@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+"""HTTP client with keep-alive connections, compression and retries."""
+
+import gzip
+import httplib
+import random
+import socket
+from StringIO import StringIO
+import threading
+import time
+import urlparse
+
+from leo.metrics import Histogram
+
+
+class FetchError(Exception):
+    """Error with downloading a resource."""
+    pass
+
+
+class _ServerError(Exception):
+    """Server responded with 5xx status, so request can be retried."""
+    pass
+
+
+class HttpFetcher(object):
+    """Downloads resources over keep-alive connections.
+
+    Every thread keeps its own connection per host, because
+    httplib connections are not thread-safe. Responses are requested
+    gzip-compressed. Failed requests are retried with jittered
+    exponential backoff. Durations of all requests are counted
+    in the timings histogram.
+    """
+
+    MAX_REDIRECTS = 3
+
+    def __init__(self, connect_timeout=10, read_timeout=30, retries=3, backoff=0.5):
+        """Initialize HttpFetcher object.
+
+        Args:
+            connect_timeout (float): seconds to wait for connection.
+            read_timeout (float): seconds to wait for data on the socket.
+            retries (int): number of retries after failed request.
+            backoff (float): seconds to wait before the first retry.
+                Every next retry waits twice as long.
+        """
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.timings = Histogram()
+        self._local = threading.local()
+
+    @classmethod
+    def from_settings(cls, settings):
+        """Create fetcher from 'subtitle_http' settings of the config.
+
+        Args:
+            settings (dict): object with optional 'connect_timeout',
+                'read_timeout', 'retries' and 'backoff' keys.
+
+        Returns:
+            HttpFetcher: new fetcher.
+        """
+        return cls(**{key: settings[key] for key in
+                      ('connect_timeout', 'read_timeout', 'retries', 'backoff')
+                      if key in settings})
+
+    def get(self, url):
+        """Download resource.
+
+        Args:
+            url (str): URL of the resource.
+
+        Returns:
+            str: decompressed body of the response.
+
+        Raises:
+            FetchError: if resource cannot be downloaded.
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                return self._get(url, self.MAX_REDIRECTS)
+            except (socket.error, httplib.HTTPException, _ServerError) as exception:
+                if attempt == self.retries:
+                    raise FetchError('Cannot download {}: {!r}'.format(url, exception))
+
+            delay = self.backoff * 2 ** attempt
+            time.sleep(delay * random.uniform(0.5, 1.5))
+
+    def _get(self, url, redirects):
+        """Send single GET request following redirects.
+
+        Raises:
+            socket.error, httplib.HTTPException: if connection failed.
+            _ServerError: if server responded with 5xx status.
+            FetchError: if response status is not successful.
+        """
+        parts = urlparse.urlsplit(url)
+        connection = self._get_connection(parts.scheme, parts.netloc)
+
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        start_time = time.time()
+        try:
+            connection.request('GET', path, headers={'Accept-Encoding': 'gzip'})
+            response = connection.getresponse()
+            body = response.read()
+        except Exception:
+            # Connection state is unknown, so it cannot be reused.
+            self._drop_connection(parts.scheme, parts.netloc)
+            raise
+        finally:
+            self.timings.observe(time.time() - start_time)
+
+        if response.status in (301, 302, 303, 307, 308) and redirects:
+            location = urlparse.urljoin(url, response.getheader('location'))
+            return self._get(location, redirects - 1)
+
+        if response.status >= 500:
+            raise _ServerError('HTTP {}'.format(response.status))
+
+        if response.status != 200:
+            raise FetchError('Cannot download {}: HTTP {}'.format(url, response.status))
+
+        if response.getheader('content-encoding') == 'gzip':
+            body = gzip.GzipFile(fileobj=StringIO(body)).read()
+
+        return body
+
+    def _get_connection(self, scheme, netloc):
+        """Return connection of the current thread to the host."""
+        if not hasattr(self._local, 'connections'):
+            self._local.connections = {}
+
+        key = (scheme, netloc)
+        connection = self._local.connections.get(key)
+
+        if connection is None:
+            connection_class = (httplib.HTTPSConnection if scheme == 'https'
+                                else httplib.HTTPConnection)
+            connection = connection_class(netloc, timeout=self.connect_timeout)
+            self._local.connections[key] = connection
+
+        # Socket is closed after the response with 'Connection: close'.
+        # Connect explicitly to set read timeout on the new socket.
+        if connection.sock is None:
+            connection.connect()
+            connection.sock.settimeout(self.read_timeout)
+
+        return connection
+
+    def _drop_connection(self, scheme, netloc):
+        """Close connection of the current thread to the host."""
+        connection = self._local.connections.pop((scheme, netloc), None)
+        if connection is not None:
+            connection.close()
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+"""Disk cache of YouTube API responses, revalidated with ETags."""
+
+import hashlib
+import os
+import threading
+
+
+class CacheStats(object):
+    """Thread-safe counters of cache hits and misses."""
+
+    def __init__(self):
+        """Initialize CacheStats object."""
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def record(self, hit):
+        """Count a response.
+
+        Args:
+            hit (bool): True, if response was served from cache.
+        """
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def format(self):
+        """Return human-readable representation of the counters."""
+        return '{} hit(s), {} miss(es)'.format(self.hits, self.misses)
+
+
+class CachingHttp(object):
+    """httplib2 connection, which keeps responses and their ETags on disk.
+
+    Cached response is sent again with If-None-Match header,
+    so 304 Not Modified is answered with the cached body.
+    YouTube API marks its responses with max-age=0, so every one
+    of them is revalidated, and data is never outdated.
+
+    Object can be passed as http argument to googleapiclient.
+
+    Request URLs contain the API key, so cache files are named
+    by hash of the URL and the directory is readable only by the user.
+    """
+
+    def __init__(self, directory, stats, timeout=None):
+        """Initialize CachingHttp object.
+
+        Args:
+            directory (str): path to the cache directory.
+            stats (CacheStats): counters to update.
+            timeout (int): socket timeout in seconds.
+        """
+        from httplib2 import FileCache, Http
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory, 0700)
+
+        self.http = Http(cache=FileCache(directory, safe=_safe_filename), timeout=timeout)
+        self.stats = stats
+
+    def request(self, uri, method='GET', *args, **kwargs):
+        """Send request, using cached response if it is not modified.
+
+        Arguments are the same as of httplib2.Http.request().
+
+        Returns:
+            tuple: httplib2.Response and its body.
+                Response has fromcache attribute set, if body is cached.
+        """
+        response, content = self.http.request(uri, method, *args, **kwargs)
+        if method == 'GET':
+            self.stats.record(response.fromcache)
+        return response, content
+
+
+def _safe_filename(key):
+    """Return name of the cache file of the request."""
+    if isinstance(key, unicode):
+        key = key.encode('utf-8')
+    return hashlib.sha1(key).hexdigest()
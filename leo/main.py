@@ -9,44 +9,74 @@ Usage:
 
 """
 
+import collections
 import datetime
-from HTMLParser import HTMLParser
+import itertools
 import json
 import os
+import Queue
 import re
-import urllib2
-
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-from httplib2 import ServerNotFoundError
-from selenium import webdriver
-from selenium.webdriver.common.keys import Keys
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+import shutil
+import sys
+import threading
+from StringIO import StringIO
+import time
+import urlparse
 
 import leo.argparser as argparser
-import leo.xml2srt as xml2srt
+import leo.retry as retry
+from leo.httpcache import CacheStats, CachingHttp
+from leo.metrics import Metrics
+from leo.quota import (QuotaBudget, QuotaExceededError, QuotaHttp, posting_period_start,
+                       schedule_channels)
+from leo.retry import RetryPolicy, SubtitlesDownloadError, SubtitlesNotFoundError
+import leo.store as store
+from leo.store import StateStore
+from leo.subcache import SubtitleCache
+from leo.util import DAY
+from leo.youtube import (DEFAULT_DISCOVERY_CACHE, ISO_8601_FORMAT, MAX_IDS_PER_REQUEST,
+                         VideoResolver, build_client, get_uploads_playlist_id,
+                         iter_new_uploads, iter_playlist_video_ids)
 
 
 YT_PREFIX = 'https://www.youtube.com/watch?v='
-ISO_8601_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+# English subtitles of the video in timedtext XML format.
+TIMEDTEXT_URL = 'http://video.google.com/timedtext?lang=en&v={}'
+
+VIDEO_ID_PATTERN = r'(?:youtube\.com/watch\?v=|youtu\.be/)([\w-]{11})'
+PLAYLIST_ID_PATTERN = r'youtube\.com/playlist\?(?:.*&)?list=([\w-]+)'
+# Extra videos are resolved and saved by chunks of this size,
+# so that every chunk costs a single videos().list request.
+EXTRA_CHUNK_SIZE = MAX_IDS_PER_REQUEST
+
+# Pages of the user's content list and links to content on them.
+CONTENT_LIST_URL = 'http://lingualeo.com/ru/jungle/my?page={page}'
+CONTENT_LINK_PATTERN = r'href="([^"]*/jungle/\d+[^"]*)"'
+# YouTube video embedded into content page.
+YT_EMBED_PATTERN = r'(?:youtube\.com/(?:embed/|watch\?v=)|youtu\.be/)([\w-]{11})'
 
 
-class CredentialsError(Exception):
-    """Error with email or password."""
-    pass
+class PublishTimeoutError(Exception):
+    """Video is still processing after the publish deadline."""
+
+    def __init__(self, message, publish_url):
+        super(PublishTimeoutError, self).__init__(message)
+        self.publish_url = publish_url
 
 
 class LeoUploader(object):
     """Uploads YouTube video to LinguaLeo."""
 
     INNER_CONFIG_NAME = os.path.join(os.path.expanduser('~'), '.leo.json')
+    COOKIES_NAME = os.path.join(os.path.expanduser('~'), '.leo_cache', 'cookies.json')
+    API_CACHE_NAME = os.path.join(os.path.expanduser('~'), '.leo_cache', 'youtube')
 
-    def __init__(self, config_filename):
+    def __init__(self, config_filename, backend='selenium'):
         """Initialize LeoUploader object.
-        Sign in to LinguaLeo.
 
         Args:
             config_filename (str): name of the config file.
+            backend (str): name of the LinguaLeo backend from BACKENDS.
 
         Raises:
             IOError: if file cannot be read.
@@ -62,22 +92,183 @@ class LeoUploader(object):
         self.password = data['password']
         self.api_key = data['api_key']
 
-        self.channels = data['channels']
-        self.extra_videos = data['extra_videos']
-        self.erroneous_videos = []
-        self.youtube = build('youtube', 'v3', developerKey=self.api_key)
+        # Optional settings, which are not present in old configs.
+        self.settings = data.get('settings', {})
+
+        # Metrics are counted only if they are written somewhere.
+        metrics_settings = self.settings.get('metrics', {})
+        self.metrics_textfile = os.path.expanduser(metrics_settings.get('textfile', ''))
+        self.metrics_json = os.path.expanduser(metrics_settings.get('json', ''))
+        self.metrics = Metrics(enabled=bool(self.metrics_textfile or self.metrics_json))
+        self.start_time = time.time()
+
+        # Set by main() with --profile.
+        self.profiler = None
+
+        # Channels and videos are kept in SQLite database next to config.
+        # Old configs keep them in JSON, so they are migrated once.
+        self.store = StateStore(self.get_state_db_name(config_filename, data))
+        if 'state_db' not in data:
+            self._migrate_config(data)
+
+        self.channels = self.store.get_channels()
+        # Failed videos are retried only when their backoff is over.
+        self.extra_videos = self.store.get_videos(store.EXTRA, retry.utcnow())
+        # Videos which were submitted, but not published before deadline.
+        self.pending_videos = self.store.get_videos(store.PENDING)
+        # IDs of uploaded videos, which are never uploaded again.
+        self.uploaded_ids = self.store.get_uploaded_ids()
+        self.subtitle_cache = SubtitleCache.from_settings(
+            self.settings.get('subtitle_cache', {})
+        )
 
-        self.driver = webdriver.Chrome()
-        self.driver.maximize_window()
+        self.retry_policy = RetryPolicy.from_settings(self.settings.get('retry', {}))
+
+        publish_settings = self.settings.get('publish', {})
+        self.publish_initial_delay = publish_settings.get('initial_delay', 2)
+        self.publish_max_delay = publish_settings.get('max_delay', 60)
+        self.publish_deadline = publish_settings.get('deadline_minutes', 15) * 60
+
+        # YouTube client and LinguaLeo backends are created on first use,
+        # so commands which only change config start fast.
+        self._youtube = None
+        self._resolver = None
+        self._subtitle_fetcher = None
+        self._init_lock = threading.Lock()
+        # httplib2 connections are not thread-safe,
+        # so every polling thread gets its own one.
+        self._local = threading.local()
+
+        # Responses of YouTube API are cached on disk and revalidated.
+        youtube_settings = self.settings.get('youtube', {})
+        self.api_cache_directory = os.path.expanduser(
+            youtube_settings.get('response_cache', self.API_CACHE_NAME)
+        )
+        self.api_cache_stats = CacheStats()
+        self.quota = QuotaBudget.from_settings(self.store, self.api_key, youtube_settings)
+
+        browser_settings = self.settings.get('browser', {})
+        self.cookies_filename = os.path.expanduser(
+            browser_settings.get('cookies_file', self.COOKIES_NAME)
+        )
+
+        # Seconds spent on launching backends and signing in.
+        self.startup_timings = collections.OrderedDict()
+
+        self.backend_name = backend
+        self.backends = []
+        # Guards progress and output of the upload workers.
+        self._upload_lock = threading.Lock()
+        # Set to stop uploading after the current videos, e.g. on SIGTERM.
+        self.stop_event = threading.Event()
+
+    @property
+    def youtube(self):
+        """YouTube API client, which is built on first access."""
+        with self._init_lock:
+            if self._youtube is None:
+                youtube_settings = self.settings.get('youtube', {})
+                self._youtube = build_client(
+                    self.api_key,
+                    os.path.expanduser(youtube_settings.get('discovery_cache',
+                                                            DEFAULT_DISCOVERY_CACHE)),
+                    youtube_settings.get('discovery_refresh_days', 7) * DAY,
+                    self._new_http()
+                )
+        return self._youtube
+
+    @property
+    def subtitle_fetcher(self):
+        """HttpFetcher for subtitles, which is created on first access."""
+        with self._init_lock:
+            if self._subtitle_fetcher is None:
+                from leo.fetcher import HttpFetcher
+                self._subtitle_fetcher = HttpFetcher.from_settings(
+                    self.settings.get('subtitle_http', {})
+                )
+        return self._subtitle_fetcher
 
-    def load_new_videos(self):
-        """Load information about new videos on the channels."""
-        for channel in self.channels:
+    @property
+    def resolver(self):
+        """VideoResolver of the YouTube API client."""
+        if self._resolver is None:
+            self._resolver = VideoResolver(self.youtube)
+        return self._resolver
+
+    def load_new_videos(self, workers=1):
+        """Load information about new videos on the channels.
+
+        Args:
+            workers (int): number of channels polled concurrently.
+        """
+        start_time = time.time()
+
+        # Channels which do not fit in today's API quota are polled next time.
+        channels, deferred = schedule_channels(
+            self.channels, self.quota,
+            self.store.get_publication_counts(posting_period_start())
+        )
+
+        if workers > 1:
+            from multiprocessing.pool import ThreadPool
+            pool = ThreadPool(workers)
             try:
-                channel['new_videos'] = self._get_new_videos(channel)
-            except HttpError:
+                results = pool.map(self._poll_channel, channels)
+            finally:
+                pool.close()
+        else:
+            results = [self._poll_channel(channel) for channel in channels]
+
+        for channel, (new_videos, _) in zip(channels, results):
+            if new_videos is None:
                 print 'Cannot get videos from channel "{}"'.format(channel['name'])
-                continue
+                new_videos = []
+            channel['new_videos'] = new_videos
+
+        for channel in deferred:
+            channel['deferred'] = True
+            channel['new_videos'] = []
+
+        # Save resolved uploads playlists and poll times.
+        self.store.save_channels(self.channels)
+
+        if workers > 1 and channels:
+            elapsed = time.time() - start_time
+            sequential_elapsed = sum(result[1] for result in results)
+            print 'Polled {} channel(s) in {:.2f}s ({:.1f}x faster than sequential)'.format(
+                len(channels),
+                elapsed,
+                sequential_elapsed / max(elapsed, 1e-6)
+            )
+
+        deferred = [channel for channel in self.channels if channel.get('deferred')]
+        if deferred:
+            print 'YouTube API quota: {} of {} unit(s) used today'.format(
+                self.quota.used, self.quota.daily_limit
+            )
+            print 'Deferred {} channel(s) to the next run: {}'.format(
+                len(deferred), ', '.join(channel['name'] for channel in deferred)
+            )
+
+    def poll_channel(self, channel):
+        """Get new videos from channel and save its state.
+
+        Args:
+            channel (dict): object with channel 'id' and 'last_refresh' keys.
+
+        Returns:
+            list: dicts with 'id', 'title' and 'published_at' keys,
+                None if videos cannot be loaded. Empty list,
+                if channel is deferred because of API quota.
+        """
+        new_videos, _ = self._poll_channel(channel)
+        self.store.save_channels([channel])
+        return new_videos
+
+    def reload_retry_queue(self):
+        """Load extra videos which can be retried now and pending videos."""
+        self.extra_videos = self.store.get_videos(store.EXTRA, retry.utcnow())
+        self.pending_videos = self.store.get_videos(store.PENDING)
 
     def any_videos_to_upload(self):
         """Check if there are any videos to upload.
@@ -86,41 +277,132 @@ class LeoUploader(object):
             bool: True, if at least one video is going to be uploaded.
                   False, otherwise.
         """
-        any_new_videos = any(channel['new_videos'] for channel in self.channels)
-        return any_new_videos or self.extra_videos
+        videos = [video for channel in self.channels for video in channel['new_videos']]
+        videos.extend(self.extra_videos)
+        any_videos = any(video['id'] not in self.uploaded_ids for video in videos)
+        return any_videos or bool(self.pending_videos)
+
+    def add_pending_videos(self):
+        """Publish videos which were submitted in previous runs,
+        but were still processing when the deadline came.
+
+        Every video is tried once, without waiting for processing,
+        so stuck videos do not block the run. They stay pending
+        until the next run.
+        """
+        print '\nChecking pending videos...'
+
+        if not self.pending_videos:
+            print '  No pending videos'
+            return
+
+        print '  Found {} video(s)'.format(len(self.pending_videos))
+
+        for video in self.pending_videos:
+            if self.stop_event.is_set():
+                break
+
+            try:
+                content_url = self._publish(self.backends[0], video['publish_url'], True,
+                                            deadline=0)
+            except PublishTimeoutError as exception:
+                print '  Not published yet: {} ({})'.format(YT_PREFIX + video['id'], exception)
+            except AttributeError as exception:
+                # Content was rejected, so video has to be uploaded again.
+                self._record_failure(video, video['channel_name'], exception)
+                print '  Unable to publish: {} ({})'.format(YT_PREFIX + video['id'], exception)
+            else:
+                self._record_upload(video, video['channel_name'], content_url)
+                print '  Successfully uploaded: {}'.format(content_url)
 
-    def add_new_videos(self):
+    def add_new_videos(self, prefetch_workers=2):
         """Upload new videos from channels to LinguaLeo.
 
         IDs of new videos are extracted with API.
         Then these IDs are used for getting subtitles.
+
+        Args:
+            prefetch_workers (int): number of threads which download
+                subtitles for the next videos while current one is uploaded.
         """
+        jobs = []
         for i, channel in enumerate(self.channels):
             # Output blank line before every channel output except first.
             if i:
                 print
             print "Checking {}...".format(channel['name'])
 
-            if not channel['new_videos']:
+            if channel.get('deferred'):
+                print '  Deferred to the next run (YouTube API quota)'
+            elif not channel['new_videos']:
                 print '  No new videos'
             else:
                 print '  Found {} new video(s)'.format(len(channel['new_videos']))
 
             for video in sorted(channel['new_videos'], key=lambda x: x['published_at']):
-                try:
-                    self._upload_video_wrapper(video, channel['name'])
-                except AttributeError as exception:
-                    print '  {}'.format(exception)
-
-                # Strip milliseconds and add one second
-                # to not upload a video twice.
-                last_refresh = self._add_one_second(
-                    video['published_at'][:-5] + 'Z'
-                )
-                channel['last_refresh'] = last_refresh
+                jobs.append((video, channel))
+
+        if jobs:
+            print '\nUploading new videos...'
+
+        self.upload_new_videos(jobs, prefetch_workers)
+
+    def upload_new_videos(self, jobs, prefetch_workers=2):
+        """Upload new videos and advance last refresh time of their channels.
+
+        Last refresh time of the channel is advanced and saved as soon as
+        the videos before it are finished one after another, i.e. uploaded
+        or saved as erroneous, so no video is skipped if run is interrupted.
+
+        Args:
+            jobs (list): pairs of video dict and channel dict.
+                Videos of the same channel go in a row, oldest first.
+            prefetch_workers (int): number of threads which download
+                subtitles for the next videos while current one is uploaded.
+        """
+        # Index of the first job of the same channel for every job.
+        channel_starts = []
+        for i, (_, channel) in enumerate(jobs):
+            if i and jobs[i - 1][1] is channel:
+                channel_starts.append(channel_starts[-1])
+            else:
+                channel_starts.append(i)
+
+        finished = [False] * len(jobs)
+
+        def advance_last_refresh(i):
+            """Mark job as finished and advance last refresh of its channel."""
+            channel = jobs[i][1]
+
+            with self._upload_lock:
+                finished[i] = True
+
+                last = channel_starts[i]
+                while last < len(jobs) and jobs[last][1] is channel and finished[last]:
+                    last += 1
+
+                if last == channel_starts[i]:
+                    return
+
+                # Add one second to not upload a video twice.
+                last_refresh = self._add_one_second(jobs[last - 1][0]['published_at'])
+                if last_refresh != channel['last_refresh']:
+                    channel['last_refresh'] = last_refresh
+                    self.store.update_last_refresh(channel['id'], last_refresh)
+
+        self._upload_videos(
+            [(video, channel['name']) for video, channel in jobs],
+            prefetch_workers,
+            advance_last_refresh
+        )
 
-    def add_extra_videos(self):
-        """Upload videos that were not uploaded in previous attempt."""
+    def add_extra_videos(self, prefetch_workers=2):
+        """Upload videos that were not uploaded in previous attempt.
+
+        Args:
+            prefetch_workers (int): number of threads which download
+                subtitles for the next videos while current one is uploaded.
+        """
         print '\nChecking extra videos...'
 
         if not self.extra_videos:
@@ -128,92 +410,216 @@ class LeoUploader(object):
         else:
             print '  Found {} video(s)'.format(len(self.extra_videos))
 
-        for video in self.extra_videos:
-            try:
-                self._upload_video_wrapper(video, video['channel_name'])
-            except AttributeError as exception:
-                print '  {}'.format(exception)
+        self._upload_videos(
+            [(video, video['channel_name']) for video in self.extra_videos],
+            prefetch_workers
+        )
 
-    def sign_in(self):
+    def sign_in(self, workers=1):
         """Authorize to LinguaLeo site.
 
+        Args:
+            workers (int): number of backends which upload videos
+                concurrently. Each of them is signed in separately.
+
         Raises:
             CredentialsError: if email and/or password is invalid.
         """
         print 'Signing in...'
-        self.driver.get('http://lingualeo.com/ru/login')
-        self.driver.find_element_by_name('email').send_keys(self.email)
-        password_field = self.driver.find_element_by_name('password')
-        password_field.send_keys(self.password)
-        password_field.send_keys(Keys.RETURN)
-        if self.driver.current_url == 'http://lingualeo.com/ru/login':
-            raise CredentialsError('Invalid email and/or password')
-        print 'Done\n'
-
-    def save_config(self, extra_videos=None):
-        """Save updated config to file."""
-        # If extra videos are provided, than they should be saved as well
-        # as erroneous videos.
-        if extra_videos is not None:
-            self.erroneous_videos.extend(extra_videos)
+        while len(self.backends) < workers:
+            self._add_backend()
+
+        cookies = self._load_cookies()
+
+        for backend in self.backends:
+            # Session saved by the previous run is reused while it is valid.
+            if cookies:
+                start_time = time.time()
+                backend.set_cookies(cookies)
+                signed_in = backend.is_signed_in()
+                self._add_startup_timing('session check', start_time)
+
+                if signed_in:
+                    continue
+
+            start_time = time.time()
+            backend.sign_in(self.email, self.password)
+            cookies = backend.get_cookies()
+            self._save_cookies(cookies)
+            self._add_startup_timing('sign in', start_time)
+
+        print 'Done in {:.1f}s ({})\n'.format(
+            sum(self.startup_timings.values()),
+            ', '.join('{} {:.1f}s'.format(name, seconds)
+                      for name, seconds in self.startup_timings.items())
+        )
+
+    def ensure_signed_in(self):
+        """Sign in again backends whose LinguaLeo session has expired.
+
+        Returns:
+            int: number of backends signed in again.
+
+        Raises:
+            CredentialsError: if email and/or password is invalid.
+        """
+        signed_in_again = 0
+        for backend in self.backends:
+            if backend.is_signed_in():
+                continue
+
+            backend.sign_in(self.email, self.password)
+            self._save_cookies(backend.get_cookies())
+            signed_in_again += 1
+        return signed_in_again
 
+    def close(self):
+        """Release LinguaLeo backends and state store."""
+        for backend in self.backends:
+            backend.close()
+        self.store.close()
+
+    def save_config(self):
+        """Save credentials and settings to config file.
+
+        Channels and videos are not saved here,
+        because store saves them as soon as they change.
+        """
         data = dict(
             api_key=self.api_key,
             email=self.email,
             password=self.password,
-            channels=[{k: channel[k] for k in channel if k != 'new_videos'} for channel in self.channels],
-            extra_videos=self.erroneous_videos
+            state_db=os.path.basename(self.store.filename)
         )
 
+        if self.settings:
+            data['settings'] = self.settings
+
         with open(self.config_filename, 'w') as outfile:
             json_data = json.dumps(data, ensure_ascii=False, indent=4)
             outfile.write(json_data.encode('utf8'))
 
-    def write_extra_videos(self, extra_videos):
-        """Save config with extended extra videos.
+    def write_extra_videos(self, urls):
+        """Save extra videos to the store.
+
+        URLs are read as a stream and their videos are resolved and saved
+        by chunks, so memory does not depend on number of videos,
+        and saved chunks are kept if import is interrupted. Videos which
+        are already queued are skipped without API requests, so interrupted
+        import can be just started again.
 
         Args:
-            extra_videos (list): list of URLs to videos.
+            urls (iterable): URLs of videos and playlists, e.g. lines of a file.
+                Empty lines and lines starting with '#' are skipped.
+
+        Returns:
+            int: number of saved videos.
 
         Raises:
-            ValueError: if URLs' format is incorrect.
+            QuotaExceededError: if daily API quota is used up.
+                Videos of the previous chunks are saved then.
         """
-        yt_video_id_pattern = r'(?:youtube\.com/watch\?v=|youtu\.be/)(.{11})'
-        video_ids = [re.search(yt_video_id_pattern, link).group(1)
-                     for link in extra_videos]
+        saved_count = 0
+        video_ids = self._iter_video_ids(urls)
 
-        extra_videos = []
+        while True:
+            chunk = list(itertools.islice(video_ids, EXTRA_CHUNK_SIZE))
+            if not chunk:
+                break
+
+            saved_count += self._write_extra_chunk(chunk)
+            print 'Saved {} video(s)'.format(saved_count)
+
+        return saved_count
+
+    def _iter_video_ids(self, urls):
+        """Yield IDs of the videos and of all videos of the playlists.
+
+        Args:
+            urls (iterable): URLs of videos and playlists.
+
+        Yields:
+            str: ID of the video.
+        """
+        from googleapiclient.errors import HttpError
+
+        for url in urls:
+            url = url.strip()
+            if not url or url.startswith('#'):
+                continue
+
+            match = re.search(PLAYLIST_ID_PATTERN, url)
+            if match:
+                try:
+                    for video_id in iter_playlist_video_ids(self.youtube, match.group(1),
+                                                            self._get_http()):
+                        yield video_id
+                except HttpError as exception:
+                    print 'Cannot get videos of playlist {} ({})'.format(url, exception)
+                continue
+
+            match = re.search(VIDEO_ID_PATTERN, url)
+            if not match:
+                print 'Not valid video URL: {}'.format(url)
+                continue
+
+            yield match.group(1)
+
+    def _write_extra_chunk(self, video_ids):
+        """Resolve and save extra videos, which are not uploaded or queued yet.
+
+        Args:
+            video_ids (list): IDs of the videos. Duplicates are allowed.
 
+        Returns:
+            int: number of saved videos.
+        """
+        queued_ids = self.store.get_queued_ids(video_ids)
+
+        new_ids = []
         for video_id in video_ids:
-            response = self.youtube.videos().list(
-                part='snippet',
-                id=video_id
-            ).execute()
+            if video_id in self.uploaded_ids:
+                print 'Already uploaded: {}'.format(YT_PREFIX + video_id)
+            elif video_id in queued_ids:
+                print 'Already queued: {}'.format(YT_PREFIX + video_id)
+            else:
+                # Video is saved once, even if it is listed several times.
+                queued_ids.add(video_id)
+                new_ids.append(video_id)
+
+        if not new_ids:
+            return 0
 
-            video_title = response['items'][0]['snippet']['title']
-            channel_id = response['items'][0]['snippet']['channelId']
+        videos = self.resolver.resolve(new_ids)
 
-            response = self.youtube.channels().list(
-                part='snippet',
-                id=channel_id
-            ).execute()
+        extra_videos = []
+        for video_id in new_ids:
+            if video_id not in videos:
+                print 'Video not found: {}'.format(YT_PREFIX + video_id)
+                continue
 
-            channel_name = response['items'][0]['snippet']['title']
+            extra_videos.append(videos[video_id])
 
-            extra_videos.append(dict(
-                id=video_id,
-                title=video_title,
-                channel_name=channel_name
-            ))
+        with self.store.transaction():
+            for video in extra_videos:
+                self.store.save_video(video, store.EXTRA)
+                # Video, which had no subtitles, is added again,
+                # because they could have been added since then.
+                self.subtitle_cache.discard(video['id'], 'en')
 
-        self.save_config(self.extra_videos + extra_videos)
+        return len(extra_videos)
 
     def write_new_channels(self, channel_urls):
-        """Add new channels to config
+        """Add new channels to the store.
+
+        Channels which are already in the store are skipped,
+        so their refresh time and uploads playlist are kept.
 
         Args:
             channel_urls (list): list with URLs to channels.
         """
+        channel_ids = set(channel['id'] for channel in self.channels)
+
         for channel_url in channel_urls:
             match = re.search(r'youtube\.com/channel/(.{24})', channel_url)
 
@@ -229,6 +635,9 @@ class LeoUploader(object):
                 search_by_id = True
 
             channel_search_param = match.group(1)
+            if search_by_id and channel_search_param in channel_ids:
+                print 'Channel is already added: {}'.format(channel_url)
+                continue
 
             search_kwargs = dict(part='snippet')
             if search_by_id:
@@ -237,154 +646,639 @@ class LeoUploader(object):
                 search_kwargs['forUsername'] = channel_search_param
 
             response = self.youtube.channels().list(**search_kwargs).execute()
+            if response['items'][0]['id'] in channel_ids:
+                print 'Channel is already added: {}'.format(channel_url)
+                continue
 
-            self.channels.append(dict(
-                channel_title=response['items'][0]['snippet']['title'],
-                channel_id=response['items'][0]['id'],
-                current_time=datetime.datetime.now().strftime(ISO_8601_FORMAT)
-            ))
+            channel = dict(
+                name=response['items'][0]['snippet']['title'],
+                id=response['items'][0]['id'],
+                # YouTube publish times are in UTC.
+                last_refresh=datetime.datetime.utcnow().strftime(ISO_8601_FORMAT)
+            )
+            self.store.save_channels([channel])
+            self.channels.append(channel)
+            channel_ids.add(channel['id'])
+
+    def _migrate_config(self, data):
+        """Move channels and videos from JSON config to the store.
+
+        Old config is kept with .bak extension.
+
+        Args:
+            data (dict): content of the JSON config.
+        """
+        with self.store.transaction():
+            # Store can already be filled, if config was replaced by its backup.
+            if self.store.is_empty():
+                self.store.save_channels([
+                    dict(
+                        # Channels added by old versions have other keys.
+                        id=channel.get('id', channel.get('channel_id')),
+                        name=channel.get('name', channel.get('channel_title')),
+                        last_refresh=channel.get('last_refresh', channel.get('current_time')),
+                        uploads_playlist=channel.get('uploads_playlist')
+                    )
+                    for channel in data.get('channels', [])
+                ])
+
+                for video in data.get('extra_videos', []):
+                    self.store.save_video(video, store.EXTRA)
+
+                for video in data.get('pending_videos', []):
+                    self.store.save_video(video, store.PENDING)
+
+        shutil.copyfile(self.config_filename, self.config_filename + '.bak')
+        self.save_config()
+
+    def print_retry_status(self):
+        """Print summary of the videos which are going to be retried."""
+        now = retry.utcnow()
+        videos = self.store.get_videos(store.EXTRA)
+
+        print 'Retry queue: {} video(s)'.format(len(videos))
+
+        # Failure class to counts of ready, waiting and given up videos
+        # and the nearest next attempt.
+        failures = collections.OrderedDict()
+        for video in videos:
+            counts = failures.setdefault(video.get('failure', 'not tried'), [0, 0, 0, None])
+            next_attempt = video.get('next_attempt')
+            if 'failure' not in video or next_attempt and next_attempt <= now:
+                counts[0] += 1
+            elif next_attempt:
+                counts[1] += 1
+                counts[3] = min(counts[3] or next_attempt, next_attempt)
+            else:
+                counts[2] += 1
+
+        for failure, (ready, waiting, given_up, next_attempt) in failures.items():
+            summary = ['{} ready'.format(ready)]
+            if waiting:
+                summary.append('{} waiting until {}'.format(waiting, next_attempt))
+            if given_up:
+                summary.append('{} not retried'.format(given_up))
+
+            print '  {}: {} video(s), {}'.format(failure, ready + waiting + given_up,
+                                                 ', '.join(summary))
+
+        print 'Pending videos: {}'.format(len(self.pending_videos))
+
+    def write_metrics(self):
+        """Write metrics of the run to the files from settings."""
+        if not self.metrics.enabled:
+            return
+
+        self.metrics.set('leo_api_cache_responses_total', self.api_cache_stats.hits,
+                         result='hit')
+        self.metrics.set('leo_api_cache_responses_total', self.api_cache_stats.misses,
+                         result='miss')
+        self.metrics.set('leo_run_duration_seconds', time.time() - self.start_time)
+        self.metrics.set('leo_last_run_timestamp_seconds', time.time())
+
+        if self.metrics_textfile:
+            self.metrics.write_textfile(self.metrics_textfile)
+        if self.metrics_json:
+            self.metrics.write_json(self.metrics_json)
+
+    def rebuild_upload_index(self):
+        """Add videos from LinguaLeo content list to the index of uploaded videos.
+
+        Content pages are opened one by one to find the YouTube video
+        they are made of, so it takes a while for long lists.
+        """
+        print '\nRebuilding index of uploaded videos...'
+        backend = self.backends[0]
+
+        content_urls = []
+        page = 1
+        while True:
+            page_url, html = backend.get_page(CONTENT_LIST_URL.format(page=page))
+            new_urls = [urlparse.urljoin(page_url, link)
+                        for link in re.findall(CONTENT_LINK_PATTERN, html)]
+            new_urls = [url for url in new_urls if url not in content_urls]
+            if not new_urls:
+                break
+
+            content_urls.extend(new_urls)
+            page += 1
+
+        print '  Found {} content page(s)'.format(len(content_urls))
+
+        added_count = 0
+        with self.store.transaction():
+            for content_url in content_urls:
+                _, html = backend.get_page(content_url)
+                match = re.search(YT_EMBED_PATTERN, html)
+                if not match or match.group(1) in self.uploaded_ids:
+                    continue
+
+                self.store.add_to_index(match.group(1), content_url)
+                self.uploaded_ids.add(match.group(1))
+                added_count += 1
+
+        print '  Added {} video(s), {} in total'.format(added_count, len(self.uploaded_ids))
+
+    def _add_backend(self):
+        """Launch one more LinguaLeo backend."""
+        from leo.backends import BACKENDS
+
+        start_time = time.time()
+        self.backends.append(BACKENDS[self.backend_name](
+            self.settings.get('browser', {}),
+            len(self.backends)
+        ))
+        self._add_startup_timing('launch', start_time)
+
+    def _add_startup_timing(self, name, start_time):
+        """Count time spent on the startup stage since start_time."""
+        elapsed = time.time() - start_time
+        self.startup_timings[name] = self.startup_timings.get(name, 0) + elapsed
+        self.metrics.observe('leo_stage_seconds', elapsed, stage=name.replace(' ', '_'))
+
+    def _load_cookies(self):
+        """Return cookies saved after the last sign in.
+
+        Returns:
+            list: dicts with cookies, None if there are no saved cookies.
+        """
+        if not self.cookies_filename:
+            return None
+
+        try:
+            with open(self.cookies_filename) as infile:
+                return json.load(infile)
+        except (IOError, ValueError):
+            return None
+
+    def _save_cookies(self, cookies):
+        """Save cookies of the signed in session.
+
+        File is readable only by the owner, because cookies authorize
+        as the user.
+
+        Args:
+            cookies (list): dicts with cookies.
+        """
+        if not self.cookies_filename:
+            return
+
+        directory = os.path.dirname(self.cookies_filename)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        descriptor = os.open(self.cookies_filename,
+                             os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(descriptor, 'w') as outfile:
+            json.dump(cookies, outfile)
+
+    def _upload_videos(self, jobs, prefetch_workers, on_finished=None):
+        """Upload videos on all signed in backends.
+
+        Every backend is used by its own thread, if there are several.
+        Videos which are already uploaded are skipped before downloading
+        subtitles and count as finished. When stop_event is set,
+        videos which are not started yet are left unfinished.
+
+        Args:
+            jobs (list): pairs of video dict and name of its channel.
+            prefetch_workers (int): number of threads which download
+                subtitles for the next videos.
+            on_finished (callable): function which is called with index
+                of every uploaded or erroneous video (in order of finishing).
+
+        Raises:
+            Exception: first network error occurred in upload threads.
+        """
+        indices = []
+        queued_ids = set()
+        for i, (video, _) in enumerate(jobs):
+            if video['id'] in self.uploaded_ids or video['id'] in queued_ids:
+                # Video can still be queued for retry, if it was uploaded
+                # by another config, or be queued twice, if several channels
+                # published it.
+                if video['id'] in queued_ids:
+                    print '  Already queued: {}'.format(YT_PREFIX + video['id'])
+                else:
+                    self.store.remove_video(video['id'])
+                    print '  Already uploaded: {}'.format(YT_PREFIX + video['id'])
+                if on_finished:
+                    on_finished(i)
+            else:
+                queued_ids.add(video['id'])
+                indices.append(i)
+
+        if not indices:
+            return
+
+        import leo.pipeline as pipeline
+
+        # Subtitles of the next videos are downloaded in background.
+        # get() method of the result object returns name of the SRT file.
+        prefetched = pipeline.prefetch(
+            indices,
+            lambda i: self._download_video_subtitles(jobs[i][0]['id']),
+            prefetch_workers
+        )
+
+        try:
+            if len(self.backends) == 1:
+                for i, subtitles in prefetched:
+                    if self.stop_event.is_set():
+                        break
+                    self._upload_job(self.backends[0], jobs[i], subtitles)
+                    if on_finished:
+                        on_finished(i)
+                return
+
+            tasks = Queue.Queue(maxsize=len(self.backends))
+            errors = []
+            threads = [threading.Thread(target=self._upload_worker,
+                                        args=(backend, jobs, tasks, on_finished, errors))
+                       for backend in self.backends]
+            for thread in threads:
+                thread.daemon = True
+                thread.start()
+
+            try:
+                for i, subtitles in prefetched:
+                    if errors or self.stop_event.is_set():
+                        break
+                    tasks.put((i, subtitles))
+            finally:
+                for _ in threads:
+                    tasks.put(None)
+                for thread in threads:
+                    # Join with timeout to keep main thread interruptible.
+                    while thread.is_alive():
+                        thread.join(1)
+        finally:
+            # Workers wait for prefetched subtitles,
+            # so prefetching is stopped only after they are done.
+            prefetched.close()
+
+        if errors:
+            raise errors[0]
+
+    def _upload_worker(self, backend, jobs, tasks, on_finished, errors):
+        """Upload videos from the tasks queue until None is received.
+
+        Args:
+            backend (Backend): signed in backend owned by the thread.
+            jobs (list): pairs of video dict and name of its channel.
+            tasks (Queue.Queue): pairs of job index and subtitles result object.
+            on_finished (callable): function called with index of finished job.
+            errors (list): exceptions which stopped uploading.
+        """
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+
+            # After an error remaining tasks are only drained.
+            if errors:
+                continue
+
+            i, subtitles = task
+            try:
+                self._upload_job(backend, jobs[i], subtitles)
+            except Exception as exception:
+                errors.append(exception)
+            else:
+                if on_finished:
+                    on_finished(i)
+
+    def _upload_job(self, backend, job, subtitles):
+        """Upload a video and print the result.
 
-    def _upload_video_wrapper(self, video, channel_name):
+        Args:
+            backend (Backend): signed in backend.
+            job (tuple): video dict and name of its channel.
+            subtitles: prefetched subtitles result object.
+        """
+        video, channel_name = job
+        try:
+            content_url = self._upload_video_wrapper(backend, video, channel_name, subtitles)
+        except (AttributeError, PublishTimeoutError) as exception:
+            message = '  {}'.format(exception)
+        else:
+            message = '  Successfully uploaded: {}'.format(content_url)
+
+        with self._upload_lock:
+            print message
+
+    def _upload_video_wrapper(self, backend, video, channel_name, subtitles):
         """Wrap _upload video function to catch exceptions.
 
         Args:
+            backend (Backend): signed in backend.
             video (dict): object with 'id' and 'title' keys.
                 Represents the video to be uploaded.
             channel_name (str): name of the channel video is from.
+            subtitles: prefetched subtitles result object.
+
+        Returns:
+            str: URL of the published content.
 
         Raises:
             AttributeError: if cannot upload.
+            PublishTimeoutError: if video is submitted, but not published.
+                It is saved as pending to be published in the next run.
         """
         try:
-            self._upload_video(video, channel_name)
-        except AttributeError as exception:
-            self.erroneous_videos.append(dict(
+            content_url = self._upload_video(backend, video, channel_name, subtitles)
+        except PublishTimeoutError as exception:
+            self.store.save_video(dict(
                 channel_name=channel_name,
                 id=video['id'],
-                title=video['title']
-            ))
+                title=video['title'],
+                publish_url=exception.publish_url
+            ), store.PENDING)
+            self.metrics.inc('leo_videos_total', result='pending')
+            raise PublishTimeoutError('Not published yet: {} ({})'.format(
+                YT_PREFIX + video['id'],
+                exception
+            ), exception.publish_url)
+        except AttributeError as exception:
+            self._record_failure(video, channel_name, exception)
             raise AttributeError('Unable to upload: {} ({})'.format(
                 YT_PREFIX + video['id'],
                 exception
             ))
-        else:
-            print '  Successfully uploaded: {}'.format(
-                self.driver.current_url
-            )
 
-    def _upload_video(self, video, channel_name):
-        """Download subtitles, fill LinguaLeo form and publish video.
+        self._record_upload(video, channel_name, content_url)
+        return content_url
+
+    def _record_failure(self, video, channel_name, exception):
+        """Save failed video to the retry queue.
 
         Args:
+            video (dict): object with 'id', 'title' and optional 'attempts' keys.
+            channel_name (str): name of the channel video is from.
+            exception (AttributeError): error raised while uploading video.
+        """
+        failure = retry.classify(exception)
+        self.metrics.inc('leo_videos_total', result=failure)
+        attempts = video.get('attempts', 0) + 1
+        self.store.record_failure(
+            dict(channel_name=channel_name, id=video['id'], title=video['title']),
+            failure,
+            attempts,
+            self.retry_policy.next_attempt(failure, attempts)
+        )
+
+    def _record_upload(self, video, channel_name, content_url):
+        """Save uploaded video to the store and the index of uploaded videos.
+
+        Args:
+            video (dict): object with 'id' and 'title' keys.
+            channel_name (str): name of the channel video is from.
+            content_url (str): URL of the content on LinguaLeo.
+        """
+        self.store.record_upload(video, channel_name, content_url)
+        self.uploaded_ids.add(video['id'])
+        self.metrics.inc('leo_videos_total', result='uploaded')
+
+    def _upload_video(self, backend, video, channel_name, subtitles):
+        """Wait for subtitles, submit LinguaLeo form and publish video.
+
+        Args:
+            backend (Backend): signed in backend.
             video (dict): object with 'id' and 'title' keys.
                 Represents the video to be uploaded.
             channel_name (str): name of the channel video is from.
+            subtitles: prefetched subtitles result object.
+
+        Returns:
+            str: URL of the published content.
 
         Raises:
             AttributeError: if English subtitles not found or name is incorrect.
+            PublishTimeoutError: if video is not published before deadline.
         """
-        subtitles_filename = self._download_video_subtitles(video['id'])
+        # Video without subtitles is rejected before any browser work.
+        subtitles_filename = subtitles.get()
 
-        self.driver.get('http://lingualeo.com/ru/jungle/add')
+        with self.metrics.timer('leo_stage_seconds', stage='submit'):
+            publish_url = backend.submit(
+                YT_PREFIX + video['id'],
+                self._generate_video_title(channel_name, video['title']),
+                os.path.abspath(subtitles_filename)
+            )
 
-        # Insert video link.
-        self.driver.find_element_by_name('content_embed').send_keys(
-            YT_PREFIX + video['id']
-        )
+        with self.metrics.timer('leo_stage_seconds', stage='publish'):
+            return self._publish(backend, publish_url, False)
 
-        # Insert video name.
-        self.driver.find_element_by_name('content_name').send_keys(
-            self._generate_video_title(channel_name, video['title'])
-        )
+    def _publish(self, backend, publish_url, refresh, deadline=None):
+        """Publish submitted video, which will redirect to final page with video.
 
-        # Insert path to the subtitles.
-        self.driver.find_element_by_name('content_srt').send_keys(
-            os.path.abspath(subtitles_filename)
-        )
+        While video is processing, publishing is retried
+        with exponential backoff until the deadline.
 
-        # Select 'Educational video' genre.
-        self.driver.find_element_by_css_selector(
-            '#genre_id > option[value="10"]'
-        ).click()
+        Args:
+            backend (Backend): signed in backend.
+            publish_url (str): URL of the Publish page.
+            refresh (bool): True, if page should be reloaded before
+                the first attempt.
+            deadline (int): number of seconds to wait for processing,
+                'deadline_minutes' setting by default.
 
-        # Submit whole form, which will redirect to Publish page.
-        self.driver.find_element_by_id('addContentForm').submit()
+        Returns:
+            str: URL of the published content.
 
-        # Remove subtitles, because they are not needed anymore.
-        os.remove(subtitles_filename)
+        Raises:
+            AttributeError: if name is incorrect.
+            PublishTimeoutError: if video is not published before deadline.
+        """
+        if deadline is None:
+            deadline = self.publish_deadline
+        deadline_time = time.time() + deadline
+        delay = self.publish_initial_delay
 
-        # Publish video, which will redirect to final page with video.
-        # If Publish button does not exist, there could be 2 reasons:
-        # - invalid input (error);
-        # - video is processing (try again in loop).
         while True:
-            try:
-                self.driver.find_element_by_id('publicContentBtn').click()
-                break
-            except NoSuchElementException:
-                if self.driver.current_url == 'http://lingualeo.com/ru/jungle/add':
-                    raise AttributeError('Cannot submit form. '
-                                         'Probably name is incorrect')
-                else:
-                    print '  Trying to publish: {}'.format(self.driver.current_url)
-                    self.driver.refresh()
+            content_url = backend.publish(publish_url, refresh)
+            if content_url:
+                return content_url
+
+            if time.time() + delay > deadline_time:
+                raise PublishTimeoutError('Still processing after {:.0f} minute(s)'.format(
+                    deadline / 60.0
+                ) if deadline else 'Still processing', publish_url)
+
+            with self._upload_lock:
+                print '  Trying to publish in {:.0f}s: {}'.format(delay, publish_url)
+            self.metrics.inc('leo_publish_refreshes_total')
+
+            # Video is saved as pending, if uploading is stopped meanwhile.
+            if self.stop_event.wait(delay):
+                raise PublishTimeoutError('Stopped while processing', publish_url)
+            delay = min(delay * 2, self.publish_max_delay)
+            refresh = True
+
+    def _poll_channel(self, channel):
+        """Get new videos from channel and measure the time it took.
+
+        Time of the poll is saved in the channel object, if it succeeds,
+        and publish times of the found videos are saved to measure
+        posting frequency of the channel.
+        Channel is marked as deferred, if API quota is used up.
+
+        Args:
+            channel (dict): object with channel 'id' and 'last_refresh' keys.
+
+        Returns:
+            tuple: list of new videos (None, if they cannot be loaded)
+                and number of seconds spent.
+        """
+        from googleapiclient.errors import HttpError
+
+        start_time = time.time()
+        channel.pop('deferred', None)
+        try:
+            new_videos = self._get_new_videos(channel, self._get_http())
+        except QuotaExceededError:
+            channel['deferred'] = True
+            new_videos = []
+        except (HttpError, ValueError):
+            new_videos = None
+        else:
+            channel['last_poll'] = datetime.datetime.utcnow().strftime(ISO_8601_FORMAT)
+            self.store.record_publications(channel['id'], new_videos, posting_period_start())
+
+        elapsed = time.time() - start_time
+        self.metrics.observe('leo_stage_seconds', elapsed, stage='poll')
+        return new_videos, elapsed
+
+    def _get_http(self):
+        """Return HTTP connection of the current thread."""
+        if not hasattr(self._local, 'http'):
+            self._local.http = self._new_http()
+        return self._local.http
+
+    def _new_http(self):
+        """Return new connection to YouTube API.
+
+        Connection charges requests to the quota and caches responses, if enabled.
+        """
+        if self.api_cache_directory:
+            http = CachingHttp(self.api_cache_directory, self.api_cache_stats)
+        else:
+            from httplib2 import Http
+            http = Http()
+        return QuotaHttp(http, self.quota, self.metrics)
 
-    def _get_new_videos(self, channel):
+    def _get_new_videos(self, channel, http=None):
         """Return new videos from channel (ID, title and publish datetime).
 
+        Videos are read from the uploads playlist of the channel.
+        ID of the playlist is cached in the channel object, so it is
+        resolved only once and then saved to config.
+
         Args:
             channel (dict): object with channel 'id' and 'last_refresh' keys.
+            http (httplib2.Http): connection to send requests with.
 
         Returns:
             list: dicts with 'id', 'title' and 'published_at'.
 
         Raises:
             HttpError: if request cannot be sent.
+            ValueError: if channel does not exist.
         """
-        search_response = self.youtube.search().list(
-            part='id, snippet',
-            type='video',
-            channelId=channel['id'],
-            publishedAfter=channel['last_refresh'],
-            maxResults=50
-        ).execute()
+        if 'uploads_playlist' not in channel:
+            channel['uploads_playlist'] = get_uploads_playlist_id(
+                self.youtube, channel['id'], http
+            )
 
-        return [dict(id=item['id']['videoId'],
-                     published_at=item['snippet']['publishedAt'],
-                     title=item['snippet']['title'])
-                for item in search_response['items']]
+        return list(iter_new_uploads(
+            self.youtube,
+            channel['uploads_playlist'],
+            channel['last_refresh'],
+            http
+        ))
 
-    @staticmethod
-    def _download_video_subtitles(video_id):
+    def _download_video_subtitles(self, video_id):
         """Download English subtitles from video and return name of the SRT file.
 
+        Subtitles cache is checked first, so network is used only
+        for videos which were not downloaded before.
+
         Args:
             video_id (str): ID of the video of which subtitiles are downloaded.
 
         Raises:
-            AttributeError: if English subtitles not found.
+            SubtitlesNotFoundError: if English subtitles not found.
+            SubtitlesDownloadError: if subtitles cannot be downloaded.
 
         Returns:
             str: name of the SRT file where subtitles are located.
         """
-        response = urllib2.urlopen(
-            'http://video.google.com/timedtext?lang=en&v={}'.format(video_id)
-        )
-        xml_text = response.read()
+        subtitles_filename = self.subtitle_cache.get(video_id, 'en')
+        if subtitles_filename:
+            self.metrics.inc('leo_subtitles_total', result='cached')
+            return subtitles_filename
 
-        if not xml_text:
-            raise AttributeError('English subtitles not found')
+        if self.subtitle_cache.is_missing(video_id, 'en'):
+            self.metrics.inc('leo_subtitles_total', result='cached_missing')
+            raise SubtitlesNotFoundError('English subtitles not found')
 
-        # Replace all escaped characters with unicode.
-        xml_text = HTMLParser().unescape(xml_text.decode('utf-8'))
+        from leo.fetcher import FetchError
 
-        srt_text = xml2srt.convert(xml_text)
+        try:
+            with self.metrics.timer('leo_stage_seconds', stage='download'):
+                xml_text = self.subtitle_fetcher.get(TIMEDTEXT_URL.format(video_id))
+        except FetchError as exception:
+            self.metrics.inc('leo_subtitles_total', result='failed')
+            raise SubtitlesDownloadError(exception)
+
+        self.metrics.inc('leo_subtitle_bytes_total', len(xml_text))
 
         subtitles_filename = '{}.srt'.format(video_id)
-        with open(subtitles_filename, 'w') as outfile:
-            outfile.write(srt_text.encode('utf8'))
+        if self.profiler:
+            with self.profiler.trace_allocations():
+                captions_count = self._convert_subtitles(xml_text, subtitles_filename)
+        else:
+            captions_count = self._convert_subtitles(xml_text, subtitles_filename)
+
+        if not captions_count:
+            os.remove(subtitles_filename)
+            self.subtitle_cache.add_missing(video_id, 'en')
+            self.metrics.inc('leo_subtitles_total', result='missing')
+            raise SubtitlesNotFoundError('English subtitles not found')
+
+        self.metrics.inc('leo_subtitles_total', result='downloaded')
+        return self.subtitle_cache.add(video_id, 'en', subtitles_filename)
 
-        return subtitles_filename
+    def _convert_subtitles(self, xml_text, subtitles_filename):
+        """Convert timedtext XML to SRT file.
+
+        Args:
+            xml_text (str): response of the timedtext endpoint.
+            subtitles_filename (str): name of the SRT file to write.
+
+        Returns:
+            int: number of converted captions, 0 if response is empty.
+
+        Raises:
+            SubtitlesDownloadError: if response is not empty, but malformed
+                or is not a transcript, e.g. it is an error page.
+                Such response is not cached.
+        """
+        import leo.xml2srt as xml2srt
+
+        with open(subtitles_filename, 'w') as outfile, \
+                self.metrics.timer('leo_stage_seconds', stage='convert'):
+            try:
+                return xml2srt.convert_stream(StringIO(xml_text), outfile)
+            except xml2srt.ParseError as exception:
+                # Response is empty, if there are no English subtitles.
+                if not xml_text.strip():
+                    return 0
+                error = exception
+
+        os.remove(subtitles_filename)
+        self.metrics.inc('leo_subtitles_total', result='invalid')
+        raise SubtitlesDownloadError('Invalid subtitles ({})'.format(error))
 
     @staticmethod
     def _add_one_second(timestamp):
@@ -454,14 +1348,36 @@ class LeoUploader(object):
         with open(config_name) as infile:
             data = json.load(infile)
 
-        extra_videos_count = len(data['extra_videos'])
-        data['extra_videos'] = []
+        if 'state_db' in data:
+            state_store = StateStore(LeoUploader.get_state_db_name(config_name, data))
+            extra_videos_count = state_store.clear_videos(store.EXTRA)
+            state_store.close()
+        else:
+            extra_videos_count = len(data['extra_videos'])
+            data['extra_videos'] = []
 
-        with open(config_name, 'w') as outfile:
-            json.dump(data, outfile, indent=4)
+            with open(config_name, 'w') as outfile:
+                json.dump(data, outfile, indent=4)
 
         print 'Cleared {} video(s)'.format(extra_videos_count)
 
+    @staticmethod
+    def get_state_db_name(config_name, data):
+        """Return path to the state database of the config.
+
+        Args:
+            config_name (str): name of the config file.
+            data (dict): content of the config.
+
+        Returns:
+            str: value of 'state_db' key or config name with .db extension,
+                relative to the config directory.
+        """
+        state_db = data.get('state_db') or (
+            os.path.splitext(os.path.basename(config_name))[0] + '.db'
+        )
+        return os.path.join(os.path.dirname(os.path.abspath(config_name)), state_db)
+
     @staticmethod
     def get_default_config():
         with open(LeoUploader.INNER_CONFIG_NAME) as infile:
@@ -482,42 +1398,169 @@ def main():
 
     config = args.config or LeoUploader.get_default_config()
 
+    profiler = None
+    if args.profile:
+        from leo.profiler import Profiler
+        profiler = Profiler(args.profile, args.profile_memory)
+
     try:
         if args.clear_extra:
             LeoUploader.clear_extra_videos(config)
             return
 
-        leo_uploader = LeoUploader(config)
+        # Loading includes migration of old configs with save_config().
+        leo_uploader = _run_phase(profiler, 'config', LeoUploader, config, args.backend)
     except (IOError, KeyError, ValueError) as exception:
         print exception
         return
 
-    if args.extra_videos or args.new_channels:
-        if args.extra_videos:
-            leo_uploader.write_extra_videos(args.extra_videos)
+    leo_uploader.profiler = profiler
+    try:
+        _run(leo_uploader, args)
+    finally:
+        leo_uploader.close()
+        if profiler:
+            _write_profile(profiler)
+
 
-        if args.new_channels:
-            leo_uploader.write_new_channels(args.new_channels)
+def _run(leo_uploader, args):
+    """Update config or upload videos, depending on arguments."""
+    profiler = leo_uploader.profiler
 
-        leo_uploader.save_config()
+    if args.retry_status:
+        leo_uploader.print_retry_status()
         return
 
-    leo_uploader.load_new_videos()
+    if args.rebuild_index:
+        leo_uploader.sign_in()
+        leo_uploader.rebuild_upload_index()
+        return
+
+    if args.extra_videos or args.extra_files or args.new_channels:
+        try:
+            if args.extra_videos:
+                _run_phase(profiler, 'write_extra_videos',
+                           leo_uploader.write_extra_videos, args.extra_videos)
+
+            for filename in args.extra_files:
+                _run_phase(profiler, 'write_extra_videos',
+                           _write_extra_file, leo_uploader, filename)
+
+            if args.new_channels:
+                _run_phase(profiler, 'write_new_channels',
+                           leo_uploader.write_new_channels, args.new_channels)
+        except QuotaExceededError as exception:
+            print exception
+
+        _print_stats(leo_uploader)
+        leo_uploader.write_metrics()
+        return
+
+    # Browser and network libraries are imported only by commands
+    # which upload videos.
+    from httplib2 import ServerNotFoundError
+    from requests import RequestException
+    from selenium.common.exceptions import TimeoutException
+
+    from leo.backends import CredentialsError
+
+    if args.daemon:
+        from leo.daemon import Daemon
+
+        daemon = Daemon.from_settings(leo_uploader, leo_uploader.settings.get('daemon', {}),
+                                      args.upload_workers, args.prefetch_workers)
+        try:
+            _run_phase(profiler, 'daemon', daemon.run)
+        except CredentialsError as exception:
+            print exception
+        return
+
+    _run_phase(profiler, 'load_new_videos', leo_uploader.load_new_videos, args.poll_workers)
 
     if leo_uploader.any_videos_to_upload():
         try:
-            leo_uploader.sign_in()
+            leo_uploader.sign_in(args.upload_workers)
         except CredentialsError as exception:
             print exception
             return
 
     try:
-        leo_uploader.add_new_videos()
-        leo_uploader.add_extra_videos()
-    except (TimeoutException, ServerNotFoundError) as exception:
+        _run_phase(profiler, 'add_new_videos',
+                   leo_uploader.add_new_videos, args.prefetch_workers)
+        _run_phase(profiler, 'add_extra_videos',
+                   leo_uploader.add_extra_videos, args.prefetch_workers)
+        _run_phase(profiler, 'add_pending_videos', leo_uploader.add_pending_videos)
+    except (TimeoutException, ServerNotFoundError, RequestException) as exception:
         print 'Network error:', exception
-    finally:
-        leo_uploader.save_config()
+
+    _print_stats(leo_uploader)
+    leo_uploader.write_metrics()
+
+
+def _write_extra_file(leo_uploader, filename):
+    """Save extra videos from the file with a URL per line.
+
+    Args:
+        leo_uploader (LeoUploader): uploader with loaded config.
+        filename (str): name of the file, '-' for standard input.
+    """
+    if filename == '-':
+        leo_uploader.write_extra_videos(sys.stdin)
+        return
+
+    try:
+        with open(filename) as infile:
+            leo_uploader.write_extra_videos(infile)
+    except IOError as exception:
+        print exception
+
+
+def _run_phase(profiler, name, func, *args):
+    """Call function, profiling it as a phase of the run with --profile.
+
+    Args:
+        profiler (Profiler): profiler of the run, None if disabled.
+        name (str): name of the phase.
+        func (callable): function to call.
+        *args: arguments of the function.
+
+    Returns:
+        Value returned by the function.
+    """
+    if not profiler:
+        return func(*args)
+
+    with profiler.phase(name):
+        return func(*args)
+
+
+def _write_profile(profiler):
+    """Write profiles and print where they are."""
+    filenames = profiler.write()
+    print '\nProfiled phases:\n{}'.format(profiler.format())
+    if profiler.tracemalloc:
+        print '\n{}'.format(profiler.format_allocations())
+    print '\nProfiles are written to: {}'.format(', '.join(filenames))
+
+
+def _print_stats(leo_uploader):
+    """Print statistics of network usage collected during the run."""
+    if leo_uploader.api_cache_stats.hits or leo_uploader.api_cache_stats.misses:
+        print '\nYouTube API cache: {}'.format(leo_uploader.api_cache_stats.format())
+
+    if leo_uploader._subtitle_fetcher and leo_uploader.subtitle_fetcher.timings.count:
+        print '\nSubtitle downloads: {}'.format(
+            leo_uploader.subtitle_fetcher.timings.format()
+        )
+
+    page_loads = [page_load for backend in leo_uploader.backends
+                  for page_load in backend.get_page_loads()]
+    if page_loads:
+        print '\nPage loads: {} page(s), {:.2f}s and {:.0f} KB on average'.format(
+            len(page_loads),
+            sum(seconds for seconds, _ in page_loads) / len(page_loads),
+            sum(transferred for _, transferred in page_loads) / 1024.0 / len(page_loads)
+        )
 
 
 if __name__ == '__main__':
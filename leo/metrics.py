@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+
+"""Counters and timers of the run stages, exported for Prometheus."""
+
+import json
+import threading
+import time
+
+from leo.util import write_atomically
+
+# Type and description of every metric.
+DESCRIPTIONS = {
+    'leo_stage_seconds': ('histogram', 'Time spent in stages of the run.'),
+    'leo_api_requests_total': ('counter', 'YouTube API requests by method.'),
+    'leo_quota_units_total': ('counter', 'YouTube API quota units spent.'),
+    'leo_api_cache_responses_total': ('counter', 'YouTube API responses by cache result.'),
+    'leo_subtitles_total': ('counter', 'Subtitle lookups by result.'),
+    'leo_subtitle_bytes_total': ('counter', 'Bytes of downloaded subtitles.'),
+    'leo_publish_refreshes_total': ('counter', 'Publish attempts repeated while video is processing.'),
+    'leo_videos_total': ('counter', 'Finished videos by result.'),
+    'leo_run_duration_seconds': ('gauge', 'Time since the start of the run.'),
+    'leo_last_run_timestamp_seconds': ('gauge', 'Time when metrics were written.'),
+}
+
+
+class Histogram(object):
+    """Thread-safe histogram of durations."""
+
+    BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self, buckets=BUCKETS):
+        """Initialize Histogram object.
+
+        Args:
+            buckets (tuple): sorted upper bounds of the buckets in seconds.
+                Durations above the last bound are counted separately.
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        """Count a duration.
+
+        Args:
+            seconds (float): duration in seconds.
+        """
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                index = i
+                break
+
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += seconds
+
+    def format(self):
+        """Return human-readable representation of the histogram.
+
+        Returns:
+            str: summary line followed by lines with non-empty buckets.
+        """
+        lines = ['{} request(s), {:.3f}s on average'.format(
+            self.count,
+            self.sum / self.count if self.count else 0
+        )]
+
+        bounds = ['<= {}s'.format(bound) for bound in self.buckets]
+        bounds.append('> {}s'.format(self.buckets[-1]))
+
+        for bound, count in zip(bounds, self.counts):
+            if count:
+                lines.append('  {:>8}: {}'.format(bound, count))
+
+        return '\n'.join(lines)
+
+
+class Metrics(object):
+    """Registry of counters, gauges and histograms with labels.
+
+    Disabled registry ignores everything, so instrumented code
+    costs only a method call. Registry can be used from several threads.
+    """
+
+    # Stages are longer than requests, so buckets are wider.
+    STAGE_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+    def __init__(self, enabled=True):
+        """Initialize Metrics object.
+
+        Args:
+            enabled (bool): False, if nothing has to be counted.
+        """
+        self.enabled = enabled
+        # Pairs of metric name and sorted label items to values.
+        self.values = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        """Increase counter.
+
+        Args:
+            name (str): name of the metric from DESCRIPTIONS.
+            value (float): increment.
+            **labels: labels of the time series.
+        """
+        if not self.enabled:
+            return
+
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        """Set value of gauge or counter, which is counted elsewhere.
+
+        Args:
+            name (str): name of the metric from DESCRIPTIONS.
+            value (float): new value.
+            **labels: labels of the time series.
+        """
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self.values[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name, seconds, **labels):
+        """Count a duration in histogram.
+
+        Args:
+            name (str): name of the metric from DESCRIPTIONS.
+            seconds (float): duration in seconds.
+            **labels: labels of the time series.
+        """
+        if not self.enabled:
+            return
+
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(self.STAGE_BUCKETS)
+        self.histograms[key].observe(seconds)
+
+    def timer(self, name, **labels):
+        """Return context manager, which observes duration of its block.
+
+        Args:
+            name (str): name of the histogram from DESCRIPTIONS.
+            **labels: labels of the time series.
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name, labels)
+
+    def write_textfile(self, filename):
+        """Write metrics in Prometheus text format.
+
+        File is replaced atomically, so node_exporter textfile collector
+        never reads a partial file.
+
+        Args:
+            filename (str): name of the .prom file.
+        """
+        lines = []
+        for name in sorted(DESCRIPTIONS):
+            metric_type, description = DESCRIPTIONS[name]
+            samples = self._samples(name)
+            if not samples:
+                continue
+
+            lines.append('# HELP {} {}'.format(name, description))
+            lines.append('# TYPE {} {}'.format(name, metric_type))
+            for suffix, labels, value in samples:
+                lines.append('{}{}{} {}'.format(name, suffix, _format_labels(labels),
+                                                _format_value(value)))
+
+        write_atomically(filename, '\n'.join(lines) + '\n')
+
+    def write_json(self, filename):
+        """Write summary of the metrics as JSON.
+
+        Args:
+            filename (str): name of the JSON file.
+        """
+        summary = {}
+        with self._lock:
+            for (name, labels), value in sorted(self.values.items()):
+                summary.setdefault(name, []).append(dict(labels=dict(labels), value=value))
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                summary.setdefault(name, []).append(dict(labels=dict(labels),
+                                                         count=histogram.count,
+                                                         sum=histogram.sum))
+
+        write_atomically(filename, json.dumps(summary, indent=4, sort_keys=True))
+
+    def _samples(self, name):
+        """Return triples of name suffix, labels and value of the metric."""
+        samples = []
+        with self._lock:
+            for (metric, labels), value in sorted(self.values.items()):
+                if metric == name:
+                    samples.append(('', labels, value))
+
+            for (metric, labels), histogram in sorted(self.histograms.items()):
+                if metric != name:
+                    continue
+
+                # Prometheus buckets are cumulative.
+                cumulative = 0
+                bounds = [str(bound) for bound in histogram.buckets] + ['+Inf']
+                for bound, count in zip(bounds, histogram.counts):
+                    cumulative += count
+                    samples.append(('_bucket', labels + (('le', bound),), cumulative))
+                samples.append(('_sum', labels, histogram.sum))
+                samples.append(('_count', labels, histogram.count))
+        return samples
+
+
+class _Timer(object):
+    """Context manager, which observes duration of its block."""
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+        self.start_time = None
+
+    def __enter__(self):
+        self.start_time = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.name, time.time() - self.start_time, **self.labels)
+
+
+class _NullTimer(object):
+    """Context manager, which does nothing."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def _format_labels(labels):
+    """Return labels in Prometheus text format, e.g. {stage="poll"}."""
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(key, str(value).replace('\\', '\\\\')
+                                                          .replace('"', '\\"'))
+                          for key, value in labels) + '}'
+
+
+def _format_value(value):
+    """Return number in Prometheus text format."""
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+"""Run slow tasks in background ahead of their consumer."""
+
+from collections import deque
+from multiprocessing.pool import ThreadPool
+
+
+def prefetch(items, func, workers=2, depth=4):
+    """Yield items together with results of func computed in background.
+
+    While consumer processes an item, results for at most depth
+    following items are computed by the pool of workers.
+    Items are yielded in the original order.
+
+    Args:
+        items (iterable): arguments for func.
+        func (callable): function that accepts one item.
+        workers (int): number of background threads.
+            If 0, func is called only when its result is requested.
+        depth (int): maximum number of results computed in advance.
+
+    Yields:
+        tuple: item and result object. Its get() method returns value
+            of func(item) or raises exception raised by func.
+    """
+    if workers < 1:
+        for item in items:
+            yield item, _LazyResult(func, item)
+        return
+
+    pool = ThreadPool(workers)
+    pending = deque()
+
+    try:
+        for item in items:
+            pending.append((item, pool.apply_async(func, (item,))))
+            if len(pending) > depth:
+                yield pending.popleft()
+
+        while pending:
+            yield pending.popleft()
+    except BaseException:
+        # Consumer stopped early, so tasks which are not started
+        # yet should be cancelled.
+        pool.terminate()
+        raise
+
+    # Last results can still be computed, so only new tasks are forbidden.
+    pool.close()
+
+
+class _LazyResult(object):
+    """Result which is computed in the calling thread on demand."""
+
+    def __init__(self, func, item):
+        self.func = func
+        self.item = item
+
+    def get(self):
+        return self.func(self.item)
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+"""CPU profiles of the run phases and allocations of subtitle conversion."""
+
+import cProfile
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+
+ALLOCATIONS_FILENAME = 'allocations.txt'
+
+
+class Profiler(object):
+    """Collects cProfile statistics of every phase of the run.
+
+    cProfile sees only the thread which runs the phase, so work of
+    the prefetch, poll and upload threads is included only if they
+    are disabled (--prefetch-workers 0, --poll-workers 1, --upload-workers 1).
+
+    Allocations are traced with tracemalloc, which is available
+    for Python 2 only as pytracemalloc on a patched interpreter.
+    """
+
+    def __init__(self, directory, trace_memory=False, top=20):
+        """Initialize Profiler object.
+
+        Args:
+            directory (str): directory to write .pstats files
+                and allocation report to. It is created, if missing.
+            trace_memory (bool): True, if allocations of subtitle
+                conversion have to be traced.
+            top (int): number of lines in the allocation report.
+        """
+        self.directory = directory
+        self.top = top
+        # Phase name to its profile, which accumulates repeated phases.
+        self.profiles = {}
+        self.phases = []
+        self.seconds = {}
+        self.peak_rss = {}
+
+        self.tracemalloc = None
+        if trace_memory:
+            try:
+                import tracemalloc
+            except ImportError:
+                print 'tracemalloc is not available, allocations are not traced'
+            else:
+                self.tracemalloc = tracemalloc
+
+        # Source line to its allocated size and number of blocks.
+        self.allocations = {}
+        self.traced_blocks = 0
+        self._memory_lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        """Profile the block as a phase of the run.
+
+        Args:
+            name (str): name of the phase, e.g. 'load_new_videos'.
+        """
+        if name not in self.profiles:
+            self.profiles[name] = cProfile.Profile()
+            self.phases.append(name)
+            self.seconds[name] = 0
+
+        profile = self.profiles[name]
+        start_time = time.time()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            self.seconds[name] += time.time() - start_time
+            self.peak_rss[name] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    @contextmanager
+    def trace_allocations(self):
+        """Count memory allocated in the block by every source line.
+
+        Traced blocks are serialized, because tracemalloc snapshots
+        include allocations of all threads.
+        """
+        if not self.tracemalloc:
+            yield
+            return
+
+        with self._memory_lock:
+            if not self.tracemalloc.is_tracing():
+                self.tracemalloc.start()
+
+            before = self._take_snapshot()
+            try:
+                yield
+            finally:
+                after = self._take_snapshot()
+                for stat in after.compare_to(before, 'lineno'):
+                    if stat.size_diff <= 0:
+                        continue
+                    frame = stat.traceback[0]
+                    size, count = self.allocations.get((frame.filename, frame.lineno), (0, 0))
+                    self.allocations[(frame.filename, frame.lineno)] = (
+                        size + stat.size_diff, count + stat.count_diff
+                    )
+                self.traced_blocks += 1
+
+    def write(self):
+        """Write .pstats file of every phase and allocation report.
+
+        Returns:
+            list: names of the written files.
+        """
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        filenames = []
+        for name in self.phases:
+            filename = os.path.join(self.directory, '{}.pstats'.format(name))
+            self.profiles[name].dump_stats(filename)
+            filenames.append(filename)
+
+        if self.tracemalloc:
+            filename = os.path.join(self.directory, ALLOCATIONS_FILENAME)
+            with open(filename, 'w') as outfile:
+                outfile.write(self.format_allocations() + '\n')
+            filenames.append(filename)
+
+        return filenames
+
+    def format(self):
+        """Return human-readable summary of the phases.
+
+        Returns:
+            str: line with time and peak RSS of every phase.
+        """
+        return '\n'.join(
+            '  {:<20} {:>8.2f}s, peak RSS {:.1f} MB'.format(
+                name, self.seconds[name], self.peak_rss[name] / 1024.0
+            )
+            for name in self.phases
+        )
+
+    def format_allocations(self):
+        """Return report of the source lines which allocated most memory.
+
+        Returns:
+            str: summary line followed by top lines by allocated size.
+        """
+        lines = ['Memory allocated by {} subtitle conversion(s), top {} line(s):'.format(
+            self.traced_blocks, self.top
+        )]
+
+        top_allocations = sorted(self.allocations.items(),
+                                 key=lambda item: item[1][0], reverse=True)[:self.top]
+        for (filename, lineno), (size, count) in top_allocations:
+            lines.append('  {:>10.1f} KB {:>8} block(s)  {}:{}'.format(
+                size / 1024.0, count, filename, lineno
+            ))
+
+        return '\n'.join(lines)
+
+    def _take_snapshot(self):
+        """Return tracemalloc snapshot without tracemalloc's own allocations."""
+        # Traces have names of the source files, not of the compiled ones.
+        source = os.path.splitext(self.tracemalloc.__file__)[0] + '.py'
+        return self.tracemalloc.take_snapshot().filter_traces((
+            self.tracemalloc.Filter(False, source),
+        ))
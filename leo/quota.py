@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+
+"""Daily quota of YouTube Data API and scheduling of channel polls."""
+
+import datetime
+import hashlib
+import json
+import threading
+import urlparse
+
+from leo.util import DAY
+from leo.youtube import ISO_8601_FORMAT
+
+DAILY_LIMIT = 10000
+
+# Units charged for a single call of the API method.
+COSTS = {
+    'search.list': 100,
+    'videos.list': 1,
+    'channels.list': 1,
+    'playlistItems.list': 1,
+}
+DEFAULT_COST = 1
+
+# Quota is reset at midnight Pacific Time. Standard time offset is used
+# all year round, so during daylight saving time day ends an hour late,
+# which only makes budget more conservative.
+PACIFIC_OFFSET = datetime.timedelta(hours=-8)
+
+# Channels, which have not uploaded anything yet, are expected
+# to publish a video once in this number of days.
+DEFAULT_POSTING_PERIOD = 30
+
+
+class QuotaExceededError(Exception):
+    """Daily quota of the API key is not enough for the request."""
+
+
+class QuotaBudget(object):
+    """Counts API units spent with the key today.
+
+    Count is kept in the store, so it is shared by all runs of the day.
+    Budget can be used from several threads.
+    """
+
+    def __init__(self, state_store, api_key, daily_limit=DAILY_LIMIT, reserve=100):
+        """Initialize QuotaBudget object.
+
+        Args:
+            state_store (StateStore): store to keep count in.
+            api_key (str): YouTube API key. Only its hash is saved.
+            daily_limit (int): number of units available per day.
+            reserve (int): number of units which are not planned
+                for polling channels, so other commands can still run.
+        """
+        self.store = state_store
+        self.api_key = hashlib.sha1(api_key).hexdigest()[:16]
+        self.daily_limit = daily_limit
+        self.reserve = reserve
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, state_store, api_key, settings):
+        """Create budget from 'youtube' settings of the config.
+
+        Args:
+            state_store (StateStore): store to keep count in.
+            api_key (str): YouTube API key.
+            settings (dict): object with optional 'daily_quota'
+                and 'quota_reserve' keys.
+
+        Returns:
+            QuotaBudget: new budget.
+        """
+        return cls(state_store, api_key,
+                   daily_limit=settings.get('daily_quota', DAILY_LIMIT),
+                   reserve=settings.get('quota_reserve', 100))
+
+    @property
+    def used(self):
+        """Number of units spent today."""
+        return self.store.get_quota_used(self.api_key, _today())
+
+    def remaining(self):
+        """Return number of units left for today."""
+        return max(self.daily_limit - self.used, 0)
+
+    def charge(self, method):
+        """Spend units on a call of the API method.
+
+        Args:
+            method (str): name of the method, e.g. 'videos.list'.
+
+        Returns:
+            int: number of units spent.
+
+        Raises:
+            QuotaExceededError: if there are not enough units left.
+                Nothing is spent then.
+        """
+        cost = COSTS.get(method, DEFAULT_COST)
+        with self._lock:
+            day = _today()
+            used = self.store.get_quota_used(self.api_key, day)
+            if used + cost > self.daily_limit:
+                raise QuotaExceededError(
+                    'Daily YouTube API quota is used up ({} of {} units)'.format(
+                        used, self.daily_limit
+                    )
+                )
+            self.store.set_quota_used(self.api_key, day, used + cost)
+        return cost
+
+    def exhaust(self):
+        """Mark quota as used up, e.g. when API rejects requests."""
+        with self._lock:
+            self.store.set_quota_used(self.api_key, _today(), self.daily_limit)
+
+
+class QuotaHttp(object):
+    """HTTP connection to YouTube API, which charges every request to budget.
+
+    Requests which do not fit in the budget are not sent at all.
+    Object can be passed as http argument to googleapiclient.
+    """
+
+    def __init__(self, http, budget, metrics=None):
+        """Initialize QuotaHttp object.
+
+        Args:
+            http (httplib2.Http): connection to send requests with.
+            budget (QuotaBudget): budget to charge.
+            metrics (Metrics): registry to count requests and units in.
+        """
+        self.http = http
+        self.budget = budget
+        self.metrics = metrics
+
+    def request(self, uri, method='GET', *args, **kwargs):
+        """Charge and send request.
+
+        Arguments are the same as of httplib2.Http.request().
+
+        Returns:
+            tuple: httplib2.Response and its body.
+
+        Raises:
+            QuotaExceededError: if there are not enough units left.
+        """
+        api_method = _api_method(uri, method)
+        units = self.budget.charge(api_method)
+        if self.metrics:
+            self.metrics.inc('leo_api_requests_total', method=api_method)
+            self.metrics.inc('leo_quota_units_total', units)
+
+        response, content = self.http.request(uri, method, *args, **kwargs)
+        if response.status == 403 and _is_quota_error(content):
+            self.budget.exhaust()
+        return response, content
+
+
+def schedule_channels(channels, budget, publication_counts, now=None):
+    """Choose channels which can be polled within the budget.
+
+    Channels which are expected to have more new videos go first.
+    Expected number of videos is posting frequency of the channel,
+    measured by videos it published during the last DEFAULT_POSTING_PERIOD
+    days, multiplied by time since the last poll. Channels which were
+    never polled go before all others.
+
+    Args:
+        channels (list): dicts with 'id' and optional 'uploads_playlist'
+            and 'last_poll' keys.
+        budget (QuotaBudget): budget of the day.
+        publication_counts (dict): channel ID to number of videos
+            published during the last DEFAULT_POSTING_PERIOD days.
+        now (datetime.datetime): current time in UTC.
+
+    Returns:
+        tuple: list of channels to poll and list of deferred channels,
+            both in order of priority.
+    """
+    now = now or datetime.datetime.utcnow()
+
+    def priority(channel):
+        if 'last_poll' not in channel:
+            return float('inf')
+
+        last_poll = datetime.datetime.strptime(channel['last_poll'], ISO_8601_FORMAT)
+        days = (now - last_poll).total_seconds() / DAY
+        frequency = (publication_counts.get(channel['id'], 0) + 1.0) / DEFAULT_POSTING_PERIOD
+        return frequency * days
+
+    available = budget.remaining() - budget.reserve
+    selected = []
+    deferred = []
+    for channel in sorted(channels, key=priority, reverse=True):
+        # Uploads playlist is resolved once with channels.list,
+        # then one playlistItems.list page is usually enough.
+        cost = COSTS['playlistItems.list']
+        if 'uploads_playlist' not in channel:
+            cost += COSTS['channels.list']
+
+        if cost <= available:
+            available -= cost
+            selected.append(channel)
+        else:
+            deferred.append(channel)
+
+    return selected, deferred
+
+
+def posting_period_start(now=None):
+    """Return start of the period, by which posting frequency is measured.
+
+    Args:
+        now (datetime.datetime): current time in UTC.
+
+    Returns:
+        str: time in ISO_8601_FORMAT.
+    """
+    now = now or datetime.datetime.utcnow()
+    return (now - datetime.timedelta(days=DEFAULT_POSTING_PERIOD)).strftime(ISO_8601_FORMAT)
+
+
+def _today():
+    """Return current day of the quota in ISO 8601 format."""
+    return (datetime.datetime.utcnow() + PACIFIC_OFFSET).date().isoformat()
+
+
+def _api_method(uri, method):
+    """Return name of the API method requested by URI, e.g. 'videos.list'."""
+    resource = urlparse.urlparse(uri).path.rstrip('/').rsplit('/', 1)[-1]
+    return '{}.{}'.format(resource, 'list' if method == 'GET' else method.lower())
+
+
+def _is_quota_error(content):
+    """Check if error response is caused by exceeded quota."""
+    try:
+        errors = json.loads(content)['error']['errors']
+    except (ValueError, KeyError, TypeError):
+        return False
+    return any(error.get('reason') in ('quotaExceeded', 'dailyLimitExceeded')
+               for error in errors)
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+"""Classification of upload failures and schedule of retries."""
+
+import datetime
+
+from leo.util import HOUR
+from leo.youtube import ISO_8601_FORMAT
+
+# Failure classes of the videos which were not uploaded.
+NO_SUBTITLES = 'no_subtitles'
+DOWNLOAD_FAILED = 'download_failed'
+REJECTED = 'rejected'
+
+# Videos with these failures are not retried, unless added again.
+PERMANENT_FAILURES = {NO_SUBTITLES}
+
+
+class SubtitlesNotFoundError(AttributeError):
+    """Video has no English subtitles."""
+
+
+class SubtitlesDownloadError(AttributeError):
+    """Subtitles cannot be downloaded right now."""
+
+
+def classify(exception):
+    """Return failure class of the upload error.
+
+    Args:
+        exception (AttributeError): error raised while uploading video.
+
+    Returns:
+        str: NO_SUBTITLES, DOWNLOAD_FAILED or REJECTED.
+    """
+    if isinstance(exception, SubtitlesNotFoundError):
+        return NO_SUBTITLES
+    if isinstance(exception, SubtitlesDownloadError):
+        return DOWNLOAD_FAILED
+    return REJECTED
+
+
+class RetryPolicy(object):
+    """Decides when failed video is uploaded again.
+
+    Transient failures are retried with exponential backoff,
+    until the video fails too many times. Permanent ones are not retried.
+    """
+
+    def __init__(self, initial_delay=HOUR, max_delay=7 * 24 * HOUR, max_attempts=8):
+        """Initialize RetryPolicy object.
+
+        Args:
+            initial_delay (int): number of seconds before the first retry.
+            max_delay (int): maximum number of seconds between retries.
+            max_attempts (int): number of failed attempts after which
+                video is not retried anymore.
+        """
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+
+    @classmethod
+    def from_settings(cls, settings):
+        """Create policy from 'retry' settings of the config.
+
+        Args:
+            settings (dict): object with optional 'initial_delay_hours',
+                'max_delay_hours' and 'max_attempts' keys.
+
+        Returns:
+            RetryPolicy: new policy.
+        """
+        return cls(
+            initial_delay=settings.get('initial_delay_hours', 1) * HOUR,
+            max_delay=settings.get('max_delay_hours', 7 * 24) * HOUR,
+            max_attempts=settings.get('max_attempts', 8)
+        )
+
+    def next_attempt(self, failure, attempts, now=None):
+        """Return time when video can be uploaded again.
+
+        Args:
+            failure (str): failure class of the last attempt.
+            attempts (int): number of failed attempts, including the last one.
+            now (datetime.datetime): time of the last attempt in UTC.
+                Current time is used by default.
+
+        Returns:
+            str: time in ISO 8601 format, None if video is not retried.
+        """
+        if failure in PERMANENT_FAILURES or attempts >= self.max_attempts:
+            return None
+
+        delay = min(self.initial_delay * 2 ** (attempts - 1), self.max_delay)
+        now = now or datetime.datetime.utcnow()
+        return (now + datetime.timedelta(seconds=delay)).strftime(ISO_8601_FORMAT)
+
+
+def utcnow():
+    """Return current time in ISO 8601 format, comparable with next attempts."""
+    return datetime.datetime.utcnow().strftime(ISO_8601_FORMAT)
@@ -0,0 +1,439 @@
+# -*- coding: utf-8 -*-
+
+"""SQLite storage of channels, upload history and videos to retry."""
+
+import contextlib
+import datetime
+import sqlite3
+import threading
+
+# States of the videos which are not uploaded yet.
+EXTRA = 'extra'
+PENDING = 'pending'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS channels (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    last_refresh TEXT NOT NULL,
+    uploads_playlist TEXT,
+    position INTEGER NOT NULL,
+    last_poll TEXT
+);
+
+CREATE TABLE IF NOT EXISTS uploads (
+    video_id TEXT PRIMARY KEY,
+    channel_name TEXT NOT NULL,
+    title TEXT NOT NULL,
+    content_url TEXT,
+    uploaded_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS videos (
+    id TEXT PRIMARY KEY,
+    channel_name TEXT NOT NULL,
+    title TEXT NOT NULL,
+    state TEXT NOT NULL,
+    publish_url TEXT,
+    position INTEGER NOT NULL,
+    failure TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt TEXT
+);
+
+CREATE TABLE IF NOT EXISTS publications (
+    video_id TEXT PRIMARY KEY,
+    channel_id TEXT NOT NULL,
+    published_at TEXT NOT NULL
+);
+
+-- Covers counting of recent publications and deletion of old ones.
+CREATE INDEX IF NOT EXISTS publications_published_at
+    ON publications (published_at, channel_id);
+
+CREATE TABLE IF NOT EXISTS quota (
+    api_key TEXT NOT NULL,
+    day TEXT NOT NULL,
+    used INTEGER NOT NULL,
+    PRIMARY KEY (api_key, day)
+);
+"""
+
+# Columns added to the tables after their creation.
+ADDED_COLUMNS = (
+    ('videos', 'failure', 'TEXT'),
+    ('videos', 'attempts', 'INTEGER NOT NULL DEFAULT 0'),
+    ('videos', 'next_attempt', 'TEXT'),
+    ('channels', 'last_poll', 'TEXT'),
+)
+
+
+class StateStore(object):
+    """Keeps state of the uploader in SQLite database.
+
+    Every method commits its changes at once, unless it is called
+    inside transaction(), which commits all changes together.
+    Store can be used from several threads.
+    """
+
+    def __init__(self, filename):
+        """Initialize StateStore object.
+        Create tables if they do not exist.
+
+        Args:
+            filename (str): name of the database file.
+        """
+        self.filename = filename
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        self._depth = 0
+
+        with self.transaction():
+            self.connection.executescript(SCHEMA)
+            self._add_missing_columns()
+
+    def _add_missing_columns(self):
+        """Upgrade tables of the database created by older version."""
+        for table, name, definition in ADDED_COLUMNS:
+            existing = {row['name'] for row in
+                        self.connection.execute('PRAGMA table_info({})'.format(table))}
+            if name not in existing:
+                self.connection.execute(
+                    'ALTER TABLE {} ADD COLUMN {} {}'.format(table, name, definition)
+                )
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Group changes, which are committed together or not at all."""
+        with self._lock:
+            self._depth += 1
+            try:
+                yield
+            except BaseException:
+                self._depth -= 1
+                if not self._depth:
+                    self.connection.rollback()
+                raise
+            else:
+                self._depth -= 1
+                if not self._depth:
+                    self.connection.commit()
+
+    def is_empty(self):
+        """Check if store has neither channels nor videos.
+
+        Returns:
+            bool: True, if there is nothing in the store. False, otherwise.
+        """
+        with self._lock:
+            for table in ('channels', 'uploads', 'videos'):
+                if self.connection.execute(
+                        'SELECT 1 FROM {} LIMIT 1'.format(table)).fetchone():
+                    return False
+        return True
+
+    def get_channels(self):
+        """Return channels in order of addition.
+
+        Returns:
+            list: dicts with 'id', 'name', 'last_refresh' and optional
+                'uploads_playlist' and 'last_poll' keys.
+        """
+        with self._lock:
+            rows = self.connection.execute(
+                'SELECT id, name, last_refresh, uploads_playlist, last_poll '
+                'FROM channels ORDER BY position'
+            ).fetchall()
+
+        channels = []
+        for row in rows:
+            channel = dict(id=row['id'], name=row['name'], last_refresh=row['last_refresh'])
+            for key in ('uploads_playlist', 'last_poll'):
+                if row[key]:
+                    channel[key] = row[key]
+            channels.append(channel)
+        return channels
+
+    def save_channels(self, channels):
+        """Add channels or update existing ones.
+
+        Args:
+            channels (list): dicts with 'id', 'name', 'last_refresh'
+                and optional 'uploads_playlist' and 'last_poll' keys.
+        """
+        with self.transaction():
+            for channel in channels:
+                self.connection.execute(
+                    'INSERT OR IGNORE INTO channels (id, name, last_refresh, position) '
+                    'VALUES (?, ?, ?, (SELECT COUNT(*) FROM channels))',
+                    (channel['id'], channel['name'], channel['last_refresh'])
+                )
+                self.connection.execute(
+                    'UPDATE channels SET name = ?, last_refresh = ?, uploads_playlist = ?, '
+                    'last_poll = ? WHERE id = ?',
+                    (channel['name'], channel['last_refresh'], channel.get('uploads_playlist'),
+                     channel.get('last_poll'), channel['id'])
+                )
+
+    def update_last_refresh(self, channel_id, last_refresh):
+        """Save time after which new videos of the channel are looked for.
+
+        Args:
+            channel_id (str): ID of the channel.
+            last_refresh (str): time in ISO 8601 format.
+        """
+        with self.transaction():
+            self.connection.execute(
+                'UPDATE channels SET last_refresh = ? WHERE id = ?',
+                (last_refresh, channel_id)
+            )
+
+    def get_videos(self, state, eligible_at=None):
+        """Return videos in the state in order of priority.
+
+        Videos which failed fewer times go first,
+        then videos are ordered by addition.
+
+        Args:
+            state (str): EXTRA or PENDING.
+            eligible_at (str): time in ISO 8601 format. If it is given,
+                only videos which can be retried at that time are returned.
+
+        Returns:
+            list: dicts with 'id', 'title', 'channel_name', 'attempts',
+                optional 'failure' and 'next_attempt' keys
+                and, for pending videos, 'publish_url' key.
+        """
+        query = ('SELECT id, title, channel_name, publish_url, failure, attempts, next_attempt '
+                 'FROM videos WHERE state = ?')
+        params = (state,)
+        if eligible_at is not None:
+            # Failed videos without next attempt are not retried anymore.
+            query += ' AND (failure IS NULL OR next_attempt <= ?)'
+            params += (eligible_at,)
+
+        with self._lock:
+            rows = self.connection.execute(
+                query + ' ORDER BY attempts, position', params
+            ).fetchall()
+
+        videos = []
+        for row in rows:
+            video = dict(id=row['id'], title=row['title'], channel_name=row['channel_name'],
+                         attempts=row['attempts'])
+            for key in ('publish_url', 'failure', 'next_attempt'):
+                if row[key]:
+                    video[key] = row[key]
+            videos.append(video)
+        return videos
+
+    def save_video(self, video, state):
+        """Add video to retry or update state of the existing one.
+
+        Failures of the video are forgotten, so it is retried at once.
+
+        Args:
+            video (dict): object with 'id', 'title', 'channel_name'
+                and optional 'publish_url' keys.
+            state (str): EXTRA or PENDING.
+        """
+        with self.transaction():
+            self._insert_video(video, state)
+            self.connection.execute(
+                'UPDATE videos SET channel_name = ?, title = ?, state = ?, publish_url = ?, '
+                'failure = NULL, attempts = 0, next_attempt = NULL '
+                'WHERE id = ?',
+                (video['channel_name'], video['title'], state,
+                 video.get('publish_url'), video['id'])
+            )
+
+    def record_failure(self, video, failure, attempts, next_attempt):
+        """Save failed video to retry it later.
+
+        Args:
+            video (dict): object with 'id', 'title' and 'channel_name' keys.
+            failure (str): failure class of the last attempt.
+            attempts (int): number of failed attempts.
+            next_attempt (str): time in ISO 8601 format when video
+                can be retried, None if it is not retried.
+        """
+        with self.transaction():
+            self._insert_video(video, EXTRA)
+            self.connection.execute(
+                'UPDATE videos SET channel_name = ?, title = ?, state = ?, publish_url = NULL, '
+                'failure = ?, attempts = ?, next_attempt = ? '
+                'WHERE id = ?',
+                (video['channel_name'], video['title'], EXTRA,
+                 failure, attempts, next_attempt, video['id'])
+            )
+
+    def _insert_video(self, video, state):
+        """Add video to the end of the queue, if it is not there yet."""
+        self.connection.execute(
+            'INSERT OR IGNORE INTO videos (id, channel_name, title, state, position) '
+            'VALUES (?, ?, ?, ?, (SELECT COALESCE(MAX(position), 0) + 1 FROM videos))',
+            (video['id'], video['channel_name'], video['title'], state)
+        )
+
+    def clear_videos(self, state):
+        """Remove all videos in the state.
+
+        Args:
+            state (str): EXTRA or PENDING.
+
+        Returns:
+            int: number of removed videos.
+        """
+        with self.transaction():
+            return self.connection.execute(
+                'DELETE FROM videos WHERE state = ?', (state,)
+            ).rowcount
+
+    def remove_video(self, video_id):
+        """Stop retrying the video.
+
+        Args:
+            video_id (str): ID of the video.
+        """
+        with self.transaction():
+            self.connection.execute('DELETE FROM videos WHERE id = ?', (video_id,))
+
+    def get_queued_ids(self, video_ids):
+        """Return IDs of the videos which wait for upload and never failed,
+        or wait for publishing.
+
+        Args:
+            video_ids (list): IDs of the videos to check.
+
+        Returns:
+            set: IDs of the queued videos among the given ones.
+        """
+        if not video_ids:
+            return set()
+
+        with self._lock:
+            return {row[0] for row in self.connection.execute(
+                'SELECT id FROM videos WHERE (state = ? AND failure IS NULL OR state = ?) '
+                'AND id IN ({})'.format(', '.join('?' * len(video_ids))),
+                [EXTRA, PENDING] + list(video_ids)
+            )}
+
+    def get_uploaded_ids(self):
+        """Return IDs of all uploaded videos.
+
+        Returns:
+            set: IDs of the videos.
+        """
+        with self._lock:
+            return {row[0] for row in
+                    self.connection.execute('SELECT video_id FROM uploads')}
+
+    def add_to_index(self, video_id, content_url):
+        """Save video uploaded outside of this store to history.
+
+        Args:
+            video_id (str): ID of the video.
+            content_url (str): URL of the content on LinguaLeo.
+        """
+        with self.transaction():
+            self.connection.execute(
+                'INSERT OR IGNORE INTO uploads '
+                '(video_id, channel_name, title, content_url, uploaded_at) '
+                "VALUES (?, '', '', ?, ?)",
+                (video_id, content_url, datetime.datetime.utcnow().isoformat())
+            )
+
+    def record_upload(self, video, channel_name, content_url):
+        """Save uploaded video to history and stop retrying it.
+
+        Args:
+            video (dict): object with 'id' and 'title' keys.
+            channel_name (str): name of the channel video is from.
+            content_url (str): URL of the content on LinguaLeo.
+        """
+        with self.transaction():
+            self.connection.execute(
+                'INSERT OR REPLACE INTO uploads '
+                '(video_id, channel_name, title, content_url, uploaded_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (video['id'], channel_name, video['title'], content_url,
+                 datetime.datetime.utcnow().isoformat())
+            )
+            self.connection.execute('DELETE FROM videos WHERE id = ?', (video['id'],))
+
+    def record_publications(self, channel_id, videos, since):
+        """Save publish times of the videos found on the channel.
+
+        Only publications after the given time are needed,
+        so older ones of all channels are deleted.
+
+        Args:
+            channel_id (str): ID of the channel.
+            videos (list): dicts with 'id' and 'published_at' keys.
+            since (str): time in ISO_8601_FORMAT.
+        """
+        with self.transaction():
+            self.connection.execute('DELETE FROM publications WHERE published_at <= ?',
+                                    (since,))
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO publications (video_id, channel_id, published_at) '
+                'VALUES (?, ?, ?)',
+                [(video['id'], channel_id, video['published_at']) for video in videos
+                 if video['published_at'] > since]
+            )
+
+    def get_publication_counts(self, since):
+        """Return number of videos published by every channel.
+
+        Args:
+            since (str): time in ISO_8601_FORMAT. Only videos
+                published after it are counted.
+
+        Returns:
+            dict: channel ID to number of videos.
+        """
+        with self._lock:
+            return dict(self.connection.execute(
+                'SELECT channel_id, COUNT(*) FROM publications '
+                'WHERE published_at > ? GROUP BY channel_id',
+                (since,)
+            ).fetchall())
+
+    def get_quota_used(self, api_key, day):
+        """Return number of API units spent during the day.
+
+        Args:
+            api_key (str): hash of the API key.
+            day (str): date in ISO 8601 format.
+
+        Returns:
+            int: number of units.
+        """
+        with self._lock:
+            row = self.connection.execute(
+                'SELECT used FROM quota WHERE api_key = ? AND day = ?', (api_key, day)
+            ).fetchone()
+        return row['used'] if row else 0
+
+    def set_quota_used(self, api_key, day, used):
+        """Save number of API units spent during the day.
+
+        Records of the previous days are removed.
+
+        Args:
+            api_key (str): hash of the API key.
+            day (str): date in ISO 8601 format.
+            used (int): number of units.
+        """
+        with self.transaction():
+            self.connection.execute('DELETE FROM quota WHERE day < ?', (day,))
+            self.connection.execute(
+                'INSERT OR REPLACE INTO quota (api_key, day, used) VALUES (?, ?, ?)',
+                (api_key, day, used)
+            )
+
+    def close(self):
+        """Close database connection."""
+        with self._lock:
+            self.connection.close()
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+
+"""On-disk cache of converted subtitles."""
+
+import hashlib
+import os
+import shutil
+import threading
+import time
+
+from leo.util import DAY
+
+MEGABYTE = 1024 * 1024
+
+
+class SubtitleCache(object):
+    """Stores SRT subtitles in a directory keyed by video ID and language.
+
+    Besides subtitles, cache remembers videos which have no subtitles
+    in the language (negative entries), so they are not requested again.
+
+    Entries expire after TTL, which is counted from the moment of adding.
+    When total size of the entries exceeds the cap, least recently used
+    entries are removed.
+    """
+
+    DEFAULT_DIRECTORY = os.path.join(os.path.expanduser('~'), '.leo_cache', 'subtitles')
+
+    SRT_EXT = '.srt'
+    MISSING_EXT = '.missing'
+
+    def __init__(self, directory=DEFAULT_DIRECTORY, max_size=100 * MEGABYTE,
+                 ttl=30 * DAY, missing_ttl=7 * DAY):
+        """Initialize SubtitleCache object.
+        Create cache directory if it does not exist.
+
+        Args:
+            directory (str): path to the cache directory.
+            max_size (int): maximum total size of the entries in bytes.
+            ttl (int): number of seconds subtitles are kept for.
+            missing_ttl (int): number of seconds negative entries are kept for.
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self.ttl = ttl
+        self.missing_ttl = missing_ttl
+        self._lock = threading.Lock()
+
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+    @classmethod
+    def from_settings(cls, settings):
+        """Create cache from 'subtitle_cache' settings of the config.
+
+        Args:
+            settings (dict): object with optional 'directory', 'max_size_mb',
+                'ttl_days' and 'missing_ttl_days' keys.
+
+        Returns:
+            SubtitleCache: new cache.
+        """
+        return cls(
+            directory=os.path.expanduser(settings.get('directory', cls.DEFAULT_DIRECTORY)),
+            max_size=settings.get('max_size_mb', 100) * MEGABYTE,
+            ttl=settings.get('ttl_days', 30) * DAY,
+            missing_ttl=settings.get('missing_ttl_days', 7) * DAY
+        )
+
+    def get(self, video_id, lang):
+        """Return name of the cached SRT file.
+
+        Args:
+            video_id (str): ID of the video.
+            lang (str): language code, e.g. 'en'.
+
+        Returns:
+            str: name of the SRT file, None if subtitles are not cached.
+        """
+        return self._lookup(self._path(video_id, lang, self.SRT_EXT), self.ttl)
+
+    def is_missing(self, video_id, lang):
+        """Check if video is known to have no subtitles in the language.
+
+        Args:
+            video_id (str): ID of the video.
+            lang (str): language code, e.g. 'en'.
+
+        Returns:
+            bool: True, if negative entry exists. False, otherwise.
+        """
+        path = self._path(video_id, lang, self.MISSING_EXT)
+        return self._lookup(path, self.missing_ttl) is not None
+
+    def add(self, video_id, lang, filename):
+        """Move SRT file into the cache.
+
+        Args:
+            video_id (str): ID of the video.
+            lang (str): language code, e.g. 'en'.
+            filename (str): name of the SRT file.
+
+        Returns:
+            str: new name of the SRT file.
+        """
+        path = self._path(video_id, lang, self.SRT_EXT)
+        with self._lock:
+            shutil.move(filename, path)
+            self._evict()
+        return path
+
+    def add_missing(self, video_id, lang):
+        """Remember that video has no subtitles in the language.
+
+        Args:
+            video_id (str): ID of the video.
+            lang (str): language code, e.g. 'en'.
+        """
+        with self._lock:
+            with open(self._path(video_id, lang, self.MISSING_EXT), 'w'):
+                pass
+            self._evict()
+
+    def discard(self, video_id, lang):
+        """Forget that video has no subtitles in the language,
+        so they are requested again.
+
+        Args:
+            video_id (str): ID of the video.
+            lang (str): language code, e.g. 'en'.
+        """
+        with self._lock:
+            try:
+                os.remove(self._path(video_id, lang, self.MISSING_EXT))
+            except OSError:
+                pass
+
+    def _path(self, video_id, lang, ext):
+        """Return path to the entry file."""
+        key = hashlib.sha1('{}:{}'.format(video_id, lang)).hexdigest()
+        return os.path.join(self.directory, key + ext)
+
+    @staticmethod
+    def _lookup(path, ttl):
+        """Return path to the entry, if it exists and is not expired.
+
+        Access time of the entry is updated for LRU eviction.
+        Modification time, which is used for TTL, is kept as is.
+        """
+        try:
+            created = os.stat(path).st_mtime
+            if created + ttl < time.time():
+                return None
+            os.utime(path, (time.time(), created))
+        except OSError:
+            return None
+        return path
+
+    def _evict(self):
+        """Remove expired entries and then least recently used ones
+        until total size of the entries fits the cap.
+        """
+        now = time.time()
+        entries = []
+        total_size = 0
+
+        for name in os.listdir(self.directory):
+            ttl = self.missing_ttl if name.endswith(self.MISSING_EXT) else self.ttl
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+                if stat.st_mtime + ttl < now:
+                    os.remove(path)
+                    continue
+            except OSError:
+                continue
+
+            entries.append((stat.st_atime, stat.st_size, path))
+            total_size += stat.st_size
+
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total_size -= size
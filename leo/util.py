@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+
+"""Helpers and constants shared by the modules."""
+
+import os
+
+MINUTE = 60
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+
+
+def write_atomically(filename, content):
+    """Replace file content, so readers never see a partial file.
+
+    Directory of the file is created, if it does not exist.
+
+    Args:
+        filename (str): name of the file.
+        content (str): new content of the file.
+    """
+    directory = os.path.dirname(filename)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    temp_filename = filename + '.tmp'
+    with open(temp_filename, 'w') as outfile:
+        outfile.write(content)
+    os.rename(temp_filename, filename)
@@ -3,7 +3,12 @@
 
 """Convert XML subtitles to SRT format."""
 
-from bs4 import BeautifulSoup
+from HTMLParser import HTMLParser
+from StringIO import StringIO
+from xml.etree.cElementTree import ParseError, iterparse
+
+# Number of captions which are formatted and written at once.
+CHUNK_SIZE = 1000
 
 
 def convert(xml_text):
@@ -14,40 +19,165 @@ def convert(xml_text):
 
     Returns:
         str: subtitles in SRT format.
+
+    Raises:
+        ParseError: if XML is malformed or is not a transcript.
     """
-    soup = BeautifulSoup(xml_text, 'html.parser')
-    captions = soup.find_all('text')
+    if isinstance(xml_text, unicode):
+        xml_text = xml_text.encode('utf-8')
+
+    outfile = StringIO()
+    convert_stream(StringIO(xml_text), outfile)
+    return outfile.getvalue().decode('utf-8')
+
+
+def convert_stream(infile, outfile):
+    """Convert XML subtitles to SRT format chunk by chunk.
+
+    Captions are written as soon as a chunk of them is parsed,
+    so the whole document is never kept in memory.
+    Escaped characters in captions are replaced with unicode.
 
-    lines = []
-    for i, caption in enumerate(captions):
-        start_time = float(caption['start'])
-        end_time = start_time + float(caption['dur'])
-        lines.append(str(i + 1))
-        lines.append(_format_time(start_time) + ' --> ' + _format_time(end_time))
-        lines.append(caption.text)
-        lines.append('')
+    Args:
+        infile (file): file-like object with subtitles in XML format.
+        outfile (file): file-like object where UTF-8 encoded
+            subtitles in SRT format are written.
+
+    Returns:
+        int: number of written captions.
+
+    Raises:
+        ParseError: if XML is malformed, empty or is not a transcript.
+    """
+    count = 0
+    chunk = []
 
-    return '\n'.join(lines)
+    for caption in _iter_captions(infile):
+        chunk.append(caption)
 
+        # The last caption is kept for the next chunk,
+        # because its end time depends on the start of the following one.
+        if len(chunk) > CHUNK_SIZE:
+            count = _write_captions(outfile, chunk[:-1], chunk[-1][0], count)
+            chunk = chunk[-1:]
 
-def _format_time(seconds):
-    """Format time to SRT standart.
+    return _write_captions(outfile, chunk, None, count)
+
+
+def format_times(times):
+    """Format times to SRT standart.
 
     SRT standart looks like this: 00:00:00,000.
 
     Args:
-        seconds (float): seconds after beginning of the video.
+        times (list): milliseconds after beginning of the video.
+
+    Returns:
+        list: formatted times.
+    """
+    formatted_times = []
+    for millisecs in times:
+        seconds, millisecs = divmod(millisecs, 1000)
+        minutes, seconds = divmod(seconds, 60)
+        hours, minutes = divmod(minutes, 60)
+        formatted_times.append(
+            '%02d:%02d:%02d,%03d' % (hours, minutes, seconds, millisecs)
+        )
+    return formatted_times
+
+
+def _iter_captions(infile):
+    """Parse captions from XML subtitles.
+
+    Args:
+        infile (file): file-like object with subtitles in XML format.
+
+    Yields:
+        tuple: start and end time in milliseconds and unicode text.
+
+    Raises:
+        ParseError: if XML is malformed, empty or is not a transcript,
+            e.g. it is an error page, or caption has invalid times.
+    """
+    unescape = HTMLParser().unescape
+    context = iterparse(infile, events=('start', 'end'))
+    _, root = next(context)
+    if root.tag != 'transcript':
+        raise ParseError('Root element is <{}>, not <transcript>'.format(root.tag))
+
+    for event, element in context:
+        if event != 'end' or element.tag != 'text':
+            continue
+
+        start_time = _to_millisecs(element.get('start'))
+        end_time = start_time + _to_millisecs(element.get('dur', '0'))
+        yield start_time, end_time, unescape(u''.join(element.itertext()))
+
+        # Drop parsed captions to keep memory usage constant.
+        root.clear()
+
+
+def _write_captions(outfile, captions, next_start_time, count):
+    """Write captions in SRT format.
+
+    End time of every caption is clamped to the start time
+    of the following caption, so captions do not overlap.
+
+    Args:
+        outfile (file): file-like object where captions are written.
+        captions (list): tuples with start and end time and text.
+        next_start_time (int): start time of the caption which follows
+            the last one in the list, None if there is no such caption.
+        count (int): number of captions written before.
 
     Returns:
-        str: formatted time.
+        int: number of captions written including the new ones.
     """
-    hours, seconds = divmod(seconds, 3600)
-    minutes, seconds = divmod(seconds, 60)
-    seconds, millisecs = divmod(seconds, 1)
+    start_times = [caption[0] for caption in captions]
+    next_start_times = start_times[1:] + [next_start_time]
+
+    end_times = []
+    for (start_time, end_time, _), next_start in zip(captions, next_start_times):
+        if next_start is not None and start_time <= next_start < end_time:
+            end_time = next_start
+        end_times.append(end_time)
 
-    hours = int(round(hours))
-    minutes = int(round(minutes))
-    seconds = int(round(seconds))
-    millisecs = int(round(millisecs * 1000))
+    # Format all times in one pass.
+    formatted_times = format_times(start_times + end_times)
+    formatted_start_times = formatted_times[:len(captions)]
+    formatted_end_times = formatted_times[len(captions):]
 
-    return '{hours:02d}:{minutes:02d}:{seconds:02d},{millisecs:03d}'.format(**locals())
+    for caption, start_time, end_time in zip(captions,
+                                             formatted_start_times,
+                                             formatted_end_times):
+        # Captions are separated with blank line.
+        if count:
+            outfile.write('\n')
+        count += 1
+
+        outfile.write('{}\n{} --> {}\n{}\n'.format(
+            count,
+            start_time,
+            end_time,
+            caption[2].encode('utf-8')
+        ))
+
+    return count
+
+
+def _to_millisecs(seconds):
+    """Convert seconds from XML attribute to integer milliseconds.
+
+    Args:
+        seconds (str): number of seconds, e.g. 12.345.
+
+    Returns:
+        int: number of milliseconds.
+
+    Raises:
+        ParseError: if attribute is missing or is not a finite number.
+    """
+    try:
+        return int(round(float(seconds) * 1000))
+    except (TypeError, ValueError, OverflowError):
+        raise ParseError('Invalid caption time: {!r}'.format(seconds))
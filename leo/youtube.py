@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+
+"""Batched requests to YouTube Data API."""
+
+import datetime
+import json
+import os
+import re
+import time
+
+from leo.util import DAY, write_atomically
+
+ISO_8601_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+DISCOVERY_URL = 'https://www.googleapis.com/discovery/v1/apis/youtube/v3/rest'
+DEFAULT_DISCOVERY_CACHE = os.path.join(os.path.expanduser('~'), '.leo_cache',
+                                       'youtube-v3.json')
+
+# Maximum number of IDs accepted by a single videos().list
+# or channels().list request.
+MAX_IDS_PER_REQUEST = 50
+
+
+class VideoResolver(object):
+    """Resolves video IDs to titles and channel names in batches.
+
+    Channel names are cached for the lifetime of the object, so videos
+    from already known channels do not cost any channels().list request.
+    """
+
+    def __init__(self, youtube):
+        """Initialize VideoResolver object.
+
+        Args:
+            youtube: YouTube API client returned by googleapiclient build().
+        """
+        self.youtube = youtube
+        self.channel_names = {}
+
+    def resolve(self, video_ids):
+        """Return metadata of the videos.
+
+        Args:
+            video_ids (list): IDs of the videos. Duplicates are allowed.
+
+        Returns:
+            dict: video ID to dict with 'id', 'title' and 'channel_name' keys.
+                Videos which do not exist are omitted.
+
+        Raises:
+            HttpError: if request cannot be sent.
+        """
+        snippets = {}
+        for chunk in _chunks(_unique(video_ids), MAX_IDS_PER_REQUEST):
+            response = self.youtube.videos().list(
+                part='snippet',
+                id=','.join(chunk),
+                maxResults=MAX_IDS_PER_REQUEST
+            ).execute()
+
+            for item in response['items']:
+                snippets[item['id']] = item['snippet']
+
+        self._load_channel_names(
+            snippet['channelId'] for snippet in snippets.values()
+        )
+
+        return {video_id: dict(id=video_id,
+                               title=snippet['title'],
+                               channel_name=self.channel_names[snippet['channelId']])
+                for video_id, snippet in snippets.items()}
+
+    def _load_channel_names(self, channel_ids):
+        """Fetch names of the channels which are not cached yet.
+
+        Args:
+            channel_ids (iterable): IDs of the channels.
+        """
+        missing_ids = [channel_id for channel_id in _unique(channel_ids)
+                       if channel_id not in self.channel_names]
+
+        for chunk in _chunks(missing_ids, MAX_IDS_PER_REQUEST):
+            response = self.youtube.channels().list(
+                part='snippet',
+                id=','.join(chunk),
+                maxResults=MAX_IDS_PER_REQUEST
+            ).execute()
+
+            for item in response['items']:
+                self.channel_names[item['id']] = item['snippet']['title']
+
+        # Channel can be missing from response (e.g. it was terminated),
+        # but its videos still have to be named somehow.
+        for channel_id in missing_ids:
+            self.channel_names.setdefault(channel_id, '-')
+
+
+def build_client(api_key, cache_filename=DEFAULT_DISCOVERY_CACHE, refresh_interval=7 * DAY,
+                 http=None):
+    """Build YouTube API client from the cached discovery document.
+
+    Document is downloaded only if it is not cached or cache is older
+    than refresh_interval. If it cannot be downloaded, stale cache is used,
+    so the client can be built offline.
+
+    Args:
+        api_key (str): YouTube API key.
+        cache_filename (str): name of the file with discovery document.
+            Empty name disables cache.
+        refresh_interval (int): number of seconds after which
+            the document is downloaded again.
+        http (httplib2.Http): connection the client sends requests with.
+            New one is created by default.
+
+    Returns:
+        YouTube API client.
+
+    Raises:
+        HttpError: if document is not cached and response status is not OK.
+        httplib2.HttpLib2Error, socket.error: if document is not cached
+            and network is unavailable.
+    """
+    from googleapiclient.discovery import build_from_document
+
+    document = None
+    if cache_filename and os.path.exists(cache_filename):
+        with open(cache_filename) as infile:
+            document = infile.read()
+
+        if time.time() - os.path.getmtime(cache_filename) < refresh_interval:
+            return build_from_document(document, developerKey=api_key, http=http)
+
+    try:
+        downloaded = _download_discovery_document()
+    except Exception:
+        # Stale document is better than a failed run.
+        if document is None:
+            raise
+    else:
+        document = downloaded
+        if cache_filename:
+            write_atomically(cache_filename, document)
+
+    return build_from_document(document, developerKey=api_key, http=http)
+
+
+def _download_discovery_document():
+    """Return discovery document of YouTube API.
+
+    Raises:
+        HttpError: if response status is not OK.
+        ValueError: if response is not valid JSON.
+    """
+    from googleapiclient.errors import HttpError
+    from httplib2 import Http
+
+    response, content = Http(timeout=30).request(DISCOVERY_URL)
+    if response.status >= 400:
+        raise HttpError(response, content, uri=DISCOVERY_URL)
+
+    # Validate document before caching it.
+    json.loads(content)
+    return content
+
+
+def get_uploads_playlist_id(youtube, channel_id, http=None):
+    """Return ID of the playlist with all uploads of the channel.
+
+    Args:
+        youtube: YouTube API client returned by googleapiclient build().
+        channel_id (str): ID of the channel.
+        http (httplib2.Http): connection to send request with.
+            Client's own connection is used by default.
+
+    Returns:
+        str: ID of the uploads playlist.
+
+    Raises:
+        HttpError: if request cannot be sent.
+        ValueError: if channel does not exist.
+    """
+    response = youtube.channels().list(
+        part='contentDetails',
+        id=channel_id
+    ).execute(http=http)
+
+    if not response['items']:
+        raise ValueError('Channel not found: {}'.format(channel_id))
+
+    return response['items'][0]['contentDetails']['relatedPlaylists']['uploads']
+
+
+def iter_new_uploads(youtube, playlist_id, published_after, http=None):
+    """Yield videos of the uploads playlist published after given time.
+
+    Uploads playlist is ordered newest-first, so pages are requested
+    only until the first video older than published_after is met.
+
+    Args:
+        youtube: YouTube API client returned by googleapiclient build().
+        playlist_id (str): ID of the uploads playlist.
+        published_after (str): time in ISO 8601 format.
+        http (httplib2.Http): connection to send requests with.
+            Client's own connection is used by default.
+
+    Yields:
+        dict: video with 'id', 'title' and 'published_at' keys.
+            'published_at' is normalized to ISO_8601_FORMAT.
+
+    Raises:
+        HttpError: if request cannot be sent.
+    """
+    published_after = normalize_timestamp(published_after)
+    page_token = None
+
+    while True:
+        response = youtube.playlistItems().list(
+            part='snippet, contentDetails',
+            playlistId=playlist_id,
+            maxResults=MAX_IDS_PER_REQUEST,
+            pageToken=page_token
+        ).execute(http=http)
+
+        for item in response['items']:
+            # Private and deleted videos have no publish time.
+            published_at = item['contentDetails'].get('videoPublishedAt')
+            if not published_at:
+                continue
+
+            published_at = normalize_timestamp(published_at)
+            if published_at < published_after:
+                return
+
+            yield dict(id=item['contentDetails']['videoId'],
+                       published_at=published_at,
+                       title=item['snippet']['title'])
+
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            return
+
+
+def iter_playlist_video_ids(youtube, playlist_id, http=None):
+    """Yield IDs of all videos of the playlist, page by page.
+
+    Args:
+        youtube: YouTube API client returned by googleapiclient build().
+        playlist_id (str): ID of the playlist.
+        http (httplib2.Http): connection to send requests with.
+            Client's own connection is used by default.
+
+    Yields:
+        str: ID of the video.
+
+    Raises:
+        HttpError: if request cannot be sent or playlist does not exist.
+    """
+    page_token = None
+
+    while True:
+        response = youtube.playlistItems().list(
+            part='contentDetails',
+            playlistId=playlist_id,
+            maxResults=MAX_IDS_PER_REQUEST,
+            pageToken=page_token
+        ).execute(http=http)
+
+        for item in response['items']:
+            yield item['contentDetails']['videoId']
+
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            return
+
+
+def normalize_timestamp(timestamp):
+    """Strip fractional seconds from time in ISO 8601 format.
+
+    Normalized timestamps can be compared as strings.
+
+    Args:
+        timestamp (str): time in ISO 8601 format, e.g. 2017-07-01T10:00:00.000Z.
+
+    Returns:
+        str: time in ISO_8601_FORMAT, e.g. 2017-07-01T10:00:00Z.
+
+    Raises:
+        ValueError: if timestamp format is incorrect.
+    """
+    timestamp = re.sub(r'\.\d*Z$', 'Z', timestamp)
+    # Validate format.
+    datetime.datetime.strptime(timestamp, ISO_8601_FORMAT)
+    return timestamp
+
+
+def _unique(items):
+    """Return list of items without duplicates, preserving order."""
+    seen = set()
+    result = []
+    for item in items:
+        if item not in seen:
+            seen.add(item)
+            result.append(item)
+    return result
+
+
+def _chunks(items, size):
+    """Split list into consecutive lists of at most size items."""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
@@ -10,7 +10,7 @@ setup(
     author='Stas Glubokiy',
     author_email='glubokiy.stas@gmail.com',
     url='https://github.com/StasDeep/LinguaLeo-Uploader',
-    packages=find_packages(),
+    packages=find_packages(exclude=['tests']),
     install_requires=required,
     entry_points={
         'console_scripts': [
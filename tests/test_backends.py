@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import leo.backends as backends
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                'benchmarks'))
+
+from fake_services import FakeServices, Options
+
+VIDEO_URL = 'https://www.youtube.com/watch?v=abcdefghijk'
+
+
+class BackendTests(object):
+    """Tests which every backend has to pass against fake LinguaLeo."""
+
+    URLS = ('HOME_URL', 'LOGIN_URL', 'ADD_CONTENT_URL')
+
+    def create_backend(self):
+        raise NotImplementedError
+
+    @classmethod
+    def setUpClass(cls):
+        cls.services = FakeServices(Options(leo_latency=0, processing_polls=2))
+        cls.services.start()
+
+        cls.urls = dict((name, getattr(backends, name)) for name in cls.URLS)
+        backends.HOME_URL = cls.services.url + '/ru/'
+        backends.LOGIN_URL = cls.services.url + '/ru/login'
+        backends.ADD_CONTENT_URL = cls.services.url + '/ru/jungle/add'
+
+    @classmethod
+    def tearDownClass(cls):
+        for name, url in cls.urls.items():
+            setattr(backends, name, url)
+        cls.services.stop()
+
+    def setUp(self):
+        self.services.reset()
+        self.services.options.reject_rate = 0
+        self.directory = tempfile.mkdtemp()
+        self.subtitles_filename = os.path.join(self.directory, 'abcdefghijk.srt')
+        with open(self.subtitles_filename, 'w') as outfile:
+            outfile.write('1\n00:00:01,000 --> 00:00:03,000\nHello\n')
+
+        self.backend = self.create_backend()
+
+    def tearDown(self):
+        self.backend.close()
+        shutil.rmtree(self.directory)
+
+    def test_invalid_password(self):
+        with self.assertRaises(backends.CredentialsError):
+            self.backend.sign_in('email', 'wrong')
+
+    def test_sign_in(self):
+        self.assertFalse(self.backend.is_signed_in())
+        self.backend.sign_in('email', self.services.options.password)
+        self.assertTrue(self.backend.is_signed_in())
+
+    def test_submit_and_publish(self):
+        self.backend.sign_in('email', self.services.options.password)
+        publish_url = self.backend.submit(VIDEO_URL, 'Title', self.subtitles_filename)
+
+        # Video is processing on the first loads of the Publish page,
+        # including the one after redirect from the form.
+        self.assertIsNone(self.backend.publish(publish_url, False))
+        for _ in range(3):
+            content_url = self.backend.publish(publish_url, True)
+            if content_url:
+                break
+
+        self.assertTrue(content_url.startswith(self.services.url + '/ru/jungle/content/'))
+        self.assertEqual(list(self.services.published), ['abcdefghijk'])
+
+    def test_rejected_form(self):
+        self.services.options.reject_rate = 1
+        self.backend.sign_in('email', self.services.options.password)
+        publish_url = self.backend.submit(VIDEO_URL, 'Title', self.subtitles_filename)
+
+        with self.assertRaises(AttributeError):
+            self.backend.publish(publish_url, True)
+        self.assertEqual(self.services.rejected, {'abcdefghijk'})
+
+
+class HttpBackendTest(BackendTests, unittest.TestCase):
+
+    def create_backend(self):
+        return backends.HttpBackend()
+
+
+class SeleniumBackendTest(BackendTests, unittest.TestCase):
+
+    def create_backend(self):
+        try:
+            return backends.SeleniumBackend(dict(headless=True))
+        except Exception as exception:
+            self.skipTest('Chrome is not available: {}'.format(exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
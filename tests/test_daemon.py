@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import unittest
+
+from leo.daemon import Daemon, UPLOAD
+
+
+class FakeUploader(object):
+    """Uploader, whose uploads fail with the given errors one after another."""
+
+    def __init__(self, errors, sessions=()):
+        self.errors = list(errors)
+        # Whether session is valid before every work item, valid by default.
+        self.sessions = list(sessions)
+        self.sign_ins = 0
+        self.stop_event = threading.Event()
+        self.uploaded = []
+        self.metrics_written = 0
+
+    def ensure_signed_in(self):
+        if self.sessions and not self.sessions.pop(0):
+            self.sign_ins += 1
+            return 1
+        return 0
+
+    def upload_new_videos(self, jobs, prefetch_workers):
+        error = self.errors.pop(0)
+        if error:
+            raise error
+        self.uploaded.extend(video['id'] for video, _ in jobs)
+
+    def write_metrics(self):
+        self.metrics_written += 1
+
+
+class UploadWorkerTest(unittest.TestCase):
+
+    def run_worker(self, uploader, channel_ids):
+        daemon = Daemon(uploader)
+        for channel_id in channel_ids:
+            daemon.busy_channels.add(channel_id)
+            daemon.work.put((UPLOAD, dict(id=channel_id),
+                             [dict(id=channel_id + '-video', published_at='2017-01-01T00:00:00Z')]))
+        daemon.work.put(None)
+
+        daemon._upload_worker()
+        return daemon
+
+    def test_unexpected_error_does_not_stop_worker(self):
+        uploader = FakeUploader([IOError('No space left on device'), None])
+        daemon = self.run_worker(uploader, ['first', 'second'])
+
+        self.assertEqual(uploader.uploaded, ['second-video'])
+        self.assertEqual(daemon.busy_channels, set())
+        self.assertEqual(uploader.metrics_written, 2)
+
+    def test_expired_session_is_signed_in_before_upload(self):
+        uploader = FakeUploader([None, None], sessions=[True, False])
+        self.run_worker(uploader, ['first', 'second'])
+
+        self.assertEqual(uploader.sign_ins, 1)
+        self.assertEqual(uploader.uploaded, ['first-video', 'second-video'])
+
+
+if __name__ == '__main__':
+    unittest.main()
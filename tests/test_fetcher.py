@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+import BaseHTTPServer
+import gzip
+import SocketServer
+from StringIO import StringIO
+import threading
+import time
+import unittest
+
+from leo.fetcher import FetchError, HttpFetcher
+
+
+class _Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Client of /slow closes connection before the response.
+        pass
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Serves responses, which exercise every feature of the fetcher."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append((self.path, self.client_address[1]))
+
+        if self.path == '/plain':
+            return self._send(200, 'plain body')
+
+        if self.path == '/gzip':
+            if 'gzip' not in self.headers.get('accept-encoding', ''):
+                return self._send(200, 'uncompressed body')
+            buffer = StringIO()
+            with gzip.GzipFile(fileobj=buffer, mode='w') as outfile:
+                outfile.write('compressed body')
+            return self._send(200, buffer.getvalue(), [('Content-Encoding', 'gzip')])
+
+        if self.path == '/flaky':
+            with server.lock:
+                server.failures -= 1
+                failed = server.failures >= 0
+            if failed:
+                return self._send(503, 'Service unavailable')
+            return self._send(200, 'recovered body')
+
+        if self.path == '/redirect':
+            return self._send(302, '', [('Location', '/plain')])
+
+        if self.path == '/slow':
+            time.sleep(0.5)
+            try:
+                return self._send(200, 'slow body')
+            finally:
+                server.slow_finished.set()
+
+        self._send(404, 'Not found')
+
+    def _send(self, status, body, headers=()):
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class HttpFetcherTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = _Server(('127.0.0.1', 0), _Handler)
+        cls.server.lock = threading.Lock()
+        thread = threading.Thread(target=cls.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        cls.url = 'http://127.0.0.1:{}'.format(cls.server.server_port)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.requests = []
+        self.server.failures = 0
+        self.server.slow_finished = threading.Event()
+        self.fetcher = HttpFetcher(connect_timeout=1, read_timeout=1, retries=2, backoff=0.01)
+
+    def tearDown(self):
+        # Close keep-alive connections, so that server threads finish.
+        for connection in getattr(self.fetcher._local, 'connections', {}).values():
+            connection.close()
+
+    def test_connection_is_reused(self):
+        self.assertEqual(self.fetcher.get(self.url + '/plain'), 'plain body')
+        self.assertEqual(self.fetcher.get(self.url + '/plain'), 'plain body')
+
+        ports = set(port for _, port in self.server.requests)
+        self.assertEqual(len(ports), 1)
+        self.assertEqual(self.fetcher.timings.count, 2)
+
+    def test_gzip_response_is_decoded(self):
+        self.assertEqual(self.fetcher.get(self.url + '/gzip'), 'compressed body')
+
+    def test_server_error_is_retried(self):
+        self.server.failures = 2
+
+        self.assertEqual(self.fetcher.get(self.url + '/flaky'), 'recovered body')
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_server_error_after_retries(self):
+        self.server.failures = 3
+
+        with self.assertRaises(FetchError):
+            self.fetcher.get(self.url + '/flaky')
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_client_error_is_not_retried(self):
+        with self.assertRaises(FetchError):
+            self.fetcher.get(self.url + '/missing')
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_redirect_is_followed(self):
+        self.assertEqual(self.fetcher.get(self.url + '/redirect'), 'plain body')
+        self.assertEqual([path for path, _ in self.server.requests], ['/redirect', '/plain'])
+
+    def test_read_timeout(self):
+        fetcher = HttpFetcher(read_timeout=0.1, retries=0)
+
+        with self.assertRaises(FetchError):
+            fetcher.get(self.url + '/slow')
+        self.server.slow_finished.wait(5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+import BaseHTTPServer
+import os
+import shutil
+import stat
+import tempfile
+import threading
+import unittest
+
+from leo.httpcache import CacheStats, CachingHttp
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Answers with current ETag of the server, or 304 if it is not modified."""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        etag = self.server.etag
+        if self.headers.get('if-none-match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        body = '{{"etag": {}}}'.format(etag)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        # Like YouTube API, every response has to be revalidated.
+        self.send_header('Cache-Control', 'private, max-age=0, must-revalidate, no-transform')
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class CachingHttpTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), _Handler)
+        thread = threading.Thread(target=cls.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        cls.url = 'http://127.0.0.1:{}/youtube/v3/videos?id=abcdefghijk&key=secret'.format(
+            cls.server.server_port
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.etag = '"1"'
+        self.directory = tempfile.mkdtemp()
+        self.cache_directory = os.path.join(self.directory, 'responses')
+        self.stats = CacheStats()
+        self.http = CachingHttp(self.cache_directory, self.stats, timeout=5)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_not_modified_response_is_served_from_cache(self):
+        _, first = self.http.request(self.url)
+        response, second = self.http.request(self.url)
+
+        self.assertTrue(response.fromcache)
+        self.assertEqual(first, second)
+        self.assertEqual((self.stats.hits, self.stats.misses), (1, 1))
+
+    def test_modified_response_is_miss(self):
+        self.http.request(self.url)
+        self.server.etag = '"2"'
+        response, content = self.http.request(self.url)
+
+        self.assertFalse(response.fromcache)
+        self.assertEqual(content, '{"etag": "2"}')
+        self.assertEqual((self.stats.hits, self.stats.misses), (0, 2))
+
+    def test_cache_files_do_not_reveal_urls(self):
+        self.http.request(self.url)
+
+        mode = stat.S_IMODE(os.stat(self.cache_directory).st_mode)
+        self.assertEqual(mode, 0700)
+        filenames = os.listdir(self.cache_directory)
+        self.assertEqual(len(filenames), 1)
+        self.assertRegexpMatches(filenames[0], '^[0-9a-f]{40}$')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import leo.retry as retry
+import leo.store as store
+from leo.main import LeoUploader
+from leo.retry import SubtitlesDownloadError, SubtitlesNotFoundError
+
+CAPTIONS = ('<?xml version="1.0" encoding="utf-8" ?><transcript>'
+            '<text start="1" dur="2">Hello</text></transcript>')
+
+
+class FakeFetcher(object):
+    """Subtitle fetcher, which returns the same response for every video."""
+
+    def __init__(self, response):
+        self.response = response
+        self.urls = []
+
+    def get(self, url):
+        self.urls.append(url)
+        return self.response
+
+
+class FakeYouTube(object):
+    """YouTube API client, which knows channels by ID and username."""
+
+    def __init__(self, channels):
+        self.channels_by_key = channels
+        self.requests = 0
+
+    def channels(self):
+        return self
+
+    def list(self, part, id=None, forUsername=None):
+        self.requests += 1
+        channel_id, title = self.channels_by_key[id or forUsername]
+        self.response = dict(items=[dict(id=channel_id, snippet=dict(title=title))])
+        return self
+
+    def execute(self):
+        return self.response
+
+
+class LeoUploaderTestCase(unittest.TestCase):
+    """Creates uploader with config in a temporary directory."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.directory)
+
+        config_filename = os.path.join(self.directory, 'config.json')
+        with open(config_filename, 'w') as outfile:
+            json.dump(dict(
+                email='email',
+                password='password',
+                api_key='key',
+                state_db='config.db',
+                settings=dict(
+                    subtitle_cache=dict(directory=os.path.join(self.directory, 'subtitles')),
+                    youtube=dict(response_cache=''),
+                    browser=dict(cookies_file='')
+                )
+            ), outfile)
+
+        self.leo_uploader = LeoUploader(config_filename, 'http')
+
+    def tearDown(self):
+        self.leo_uploader.close()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
+
+
+class DownloadSubtitlesTest(LeoUploaderTestCase):
+
+    def download(self, response):
+        self.leo_uploader._subtitle_fetcher = FakeFetcher(response)
+        return self.leo_uploader._download_video_subtitles('abcdefghijk')
+
+    def test_subtitles_are_converted_and_cached(self):
+        filename = self.download(CAPTIONS)
+
+        with open(filename) as infile:
+            self.assertEqual(infile.read(), '1\n00:00:01,000 --> 00:00:03,000\nHello\n')
+        self.assertEqual(self.leo_uploader.subtitle_cache.get('abcdefghijk', 'en'), filename)
+
+    def test_empty_response_means_no_subtitles(self):
+        with self.assertRaises(SubtitlesNotFoundError) as context:
+            self.download('')
+
+        self.assertEqual(retry.classify(context.exception), retry.NO_SUBTITLES)
+        self.assertTrue(self.leo_uploader.subtitle_cache.is_missing('abcdefghijk', 'en'))
+
+    def test_malformed_response_is_transient_failure(self):
+        with self.assertRaises(SubtitlesDownloadError) as context:
+            self.download('<html><body>Server error<br></body></html>')
+
+        self.assertEqual(retry.classify(context.exception), retry.DOWNLOAD_FAILED)
+        self.assertFalse(self.leo_uploader.subtitle_cache.is_missing('abcdefghijk', 'en'))
+        self.assertFalse(os.path.exists('abcdefghijk.srt'))
+
+    def test_error_page_and_invalid_captions_are_transient_failures(self):
+        for response in ('<html><body><p>Service unavailable</p></body></html>',
+                         '<transcript><text dur="2">Hello</text></transcript>'):
+            with self.assertRaises(SubtitlesDownloadError):
+                self.download(response)
+
+            self.assertFalse(self.leo_uploader.subtitle_cache.is_missing('abcdefghijk', 'en'))
+            self.assertFalse(os.path.exists('abcdefghijk.srt'))
+
+
+class FakeResolver(object):
+    """Video resolver, which knows every video."""
+
+    def resolve(self, video_ids):
+        return dict((video_id, dict(id=video_id, title='Video', channel_name='Channel'))
+                    for video_id in video_ids)
+
+
+class WriteExtraTest(LeoUploaderTestCase):
+
+    def test_readded_video_is_checked_for_subtitles_again(self):
+        self.leo_uploader._resolver = FakeResolver()
+        self.leo_uploader.subtitle_cache.add_missing('abcdefghijk', 'en')
+
+        self.assertEqual(self.leo_uploader._write_extra_chunk(['abcdefghijk']), 1)
+        self.assertFalse(self.leo_uploader.subtitle_cache.is_missing('abcdefghijk', 'en'))
+
+    def test_pending_video_is_not_queued_again(self):
+        self.leo_uploader._resolver = FakeResolver()
+        video = dict(id='abcdefghijk', title='Video', channel_name='Channel',
+                     publish_url='http://lingualeo.com/ru/jungle/publish/1')
+        self.leo_uploader.store.save_video(video, store.PENDING)
+
+        self.assertEqual(self.leo_uploader._write_extra_chunk(['abcdefghijk']), 0)
+        self.assertEqual(self.leo_uploader.store.get_videos(store.EXTRA), [])
+        pending = self.leo_uploader.store.get_videos(store.PENDING)
+        self.assertEqual([(v['id'], v['publish_url']) for v in pending],
+                         [('abcdefghijk', video['publish_url'])])
+
+
+class WriteNewChannelsTest(LeoUploaderTestCase):
+
+    CHANNEL_ID = 'UC' + 'a' * 22
+
+    def setUp(self):
+        super(WriteNewChannelsTest, self).setUp()
+        self.youtube = FakeYouTube({
+            self.CHANNEL_ID: (self.CHANNEL_ID, 'Channel'),
+            'user': (self.CHANNEL_ID, 'Channel')
+        })
+        self.leo_uploader._youtube = self.youtube
+
+    def test_existing_channel_is_kept(self):
+        channel_url = 'https://www.youtube.com/channel/' + self.CHANNEL_ID
+        self.leo_uploader.write_new_channels([channel_url])
+        channel = self.leo_uploader.channels[0]
+        channel.update(last_refresh='2017-01-01T00:00:00Z', uploads_playlist='UU' + 'a' * 22)
+        self.leo_uploader.store.save_channels([channel])
+
+        self.leo_uploader.write_new_channels([channel_url, 'https://www.youtube.com/user/user'])
+
+        self.assertEqual(self.leo_uploader.store.get_channels(), [channel])
+        self.assertEqual(self.leo_uploader.channels, [channel])
+        # Channel URL with ID is checked without API request.
+        self.assertEqual(self.youtube.requests, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
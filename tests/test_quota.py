@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+import unittest
+
+from leo.daemon import poll_interval
+from leo.quota import QuotaBudget, posting_period_start, schedule_channels
+from leo.store import StateStore
+
+NOW = datetime.datetime(2017, 3, 1)
+
+
+class PublicationCountsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = StateStore(':memory:')
+        self.budget = QuotaBudget(self.store, 'key', daily_limit=100, reserve=0)
+
+    def tearDown(self):
+        self.store.close()
+
+    def record(self, channel_id, *days_ago):
+        self.store.record_publications(channel_id, [
+            dict(id='{}-{}'.format(channel_id, days),
+                 published_at=(NOW - datetime.timedelta(days=days)).strftime(
+                     '%Y-%m-%dT%H:%M:%SZ'
+                 ))
+            for days in days_ago
+        ], posting_period_start(NOW))
+
+    def test_only_recent_videos_are_counted_by_channel_id(self):
+        self.record('active', 1, 2, 3)
+        self.record('quiet', 40)
+        # Video found by several polls is counted once.
+        self.record('active', 1)
+
+        self.assertEqual(self.store.get_publication_counts(posting_period_start(NOW)),
+                         dict(active=3))
+
+    def test_old_publications_are_deleted(self):
+        self.record('active', 1)
+        self.record('quiet', 40)
+        self.store.record_publications('active', [], posting_period_start(
+            NOW + datetime.timedelta(days=30)
+        ))
+
+        self.assertEqual(self.store.connection.execute(
+            'SELECT COUNT(*) FROM publications'
+        ).fetchone()[0], 0)
+
+    def test_frequent_channel_is_polled_first_and_more_often(self):
+        self.record('active', 1, 2, 3)
+        last_poll = (NOW - datetime.timedelta(days=1)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        # Names do not matter, e.g. channel can be renamed.
+        channels = [dict(id='quiet', name='Channel', last_poll=last_poll),
+                    dict(id='active', name='Channel', last_poll=last_poll)]
+        counts = self.store.get_publication_counts(posting_period_start(NOW))
+
+        selected, deferred = schedule_channels(channels, self.budget, counts, NOW)
+
+        self.assertEqual([channel['id'] for channel in selected], ['active', 'quiet'])
+        self.assertEqual(deferred, [])
+        self.assertLess(poll_interval(counts.get('active', 0), 0, float('inf')),
+                        poll_interval(counts.get('quiet', 0), 0, float('inf')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+import imp
+import os
+from StringIO import StringIO
+import unittest
+
+import leo.xml2srt as xml2srt
+
+legacy = imp.load_source(
+    'legacy_xml2srt',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                 'benchmarks', 'xml2srt.py')
+)
+
+
+class LegacyOutputTest(unittest.TestCase):
+
+    def setUp(self):
+        # Legacy converter needs BeautifulSoup from requirements-dev.txt.
+        try:
+            import bs4
+        except ImportError:
+            self.skipTest('beautifulsoup4 is not installed')
+
+    def test_output_is_identical_to_legacy_converter(self):
+        for captions in (1, 10, 2500):
+            xml_text = legacy.generate(captions)
+            self.assertEqual(xml2srt.convert(xml_text), legacy.legacy_convert(xml_text))
+
+
+def make_xml(captions):
+    """Return timedtext XML with captions given as (start, dur, text)."""
+    return ('<?xml version="1.0" encoding="utf-8" ?><transcript>{}</transcript>'.format(
+        ''.join('<text start="{}" dur="{}">{}</text>'.format(*caption) for caption in captions)
+    ))
+
+
+def convert_stream(xml_text):
+    infile = StringIO(xml_text)
+    outfile = StringIO()
+    count = xml2srt.convert_stream(infile, outfile)
+    return count, outfile.getvalue()
+
+
+class FormatTimesTest(unittest.TestCase):
+
+    def test_milliseconds_carry_to_seconds(self):
+        self.assertEqual(xml2srt.format_times([0, 999, 1000, 1001]),
+                         ['00:00:00,000', '00:00:00,999', '00:00:01,000', '00:00:01,001'])
+
+    def test_hours(self):
+        self.assertEqual(xml2srt.format_times([3599999, 3600000, 36000000 + 61001]),
+                         ['00:59:59,999', '01:00:00,000', '10:01:01,001'])
+
+
+class ConvertStreamTest(unittest.TestCase):
+
+    def test_fractional_seconds_are_rounded_to_milliseconds(self):
+        count, srt = convert_stream(make_xml([('1.9996', '0.0004', 'a'), ('2.5', '1', 'b')]))
+
+        self.assertEqual(count, 2)
+        self.assertEqual(srt, '1\n00:00:02,000 --> 00:00:02,000\na\n\n'
+                              '2\n00:00:02,500 --> 00:00:03,500\nb\n')
+
+    def test_overlapping_captions_are_clamped(self):
+        _, srt = convert_stream(make_xml([('1', '5', 'a'), ('2', '1', 'b'), ('3', '0.5', 'c')]))
+
+        self.assertEqual(srt, '1\n00:00:01,000 --> 00:00:02,000\na\n\n'
+                              '2\n00:00:02,000 --> 00:00:03,000\nb\n\n'
+                              '3\n00:00:03,000 --> 00:00:03,500\nc\n')
+
+    def test_missing_duration(self):
+        _, srt = convert_stream('<transcript><text start="1">a</text></transcript>')
+
+        self.assertEqual(srt, '1\n00:00:01,000 --> 00:00:01,000\na\n')
+
+    def test_escaped_text(self):
+        _, srt = convert_stream(make_xml([('0', '1', 'I&amp;#39;m &amp;amp; \xd1\x8f')]))
+
+        self.assertEqual(srt, "1\n00:00:00,000 --> 00:00:01,000\nI'm & \xd1\x8f\n")
+
+    def test_output_does_not_depend_on_chunk_size(self):
+        # Every caption overlaps the next one, including those
+        # which straddle a chunk boundary.
+        xml_text = make_xml([(i, 1.5, 'caption {}'.format(i)) for i in range(11)])
+        expected = convert_stream(xml_text)
+
+        chunk_size = xml2srt.CHUNK_SIZE
+        try:
+            for xml2srt.CHUNK_SIZE in (1, 2, 3, 10):
+                self.assertEqual(convert_stream(xml_text), expected)
+        finally:
+            xml2srt.CHUNK_SIZE = chunk_size
+
+        self.assertIn('00:00:09,000 --> 00:00:10,000', expected[1])
+
+    def test_empty_response(self):
+        with self.assertRaises(xml2srt.ParseError):
+            convert_stream('')
+
+    def test_well_formed_error_page(self):
+        with self.assertRaises(xml2srt.ParseError):
+            convert_stream('<html><body><p>Service unavailable</p></body></html>')
+
+    def test_invalid_caption_times(self):
+        for attributes in ('dur="1"', 'start="soon"', 'start="1" dur="inf"'):
+            with self.assertRaises(xml2srt.ParseError):
+                convert_stream('<transcript><text {}>Hello</text></transcript>'.format(
+                    attributes
+                ))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from leo.youtube import MAX_IDS_PER_REQUEST, VideoResolver
+
+
+class FakeRequest(object):
+    """Request object of the fake client."""
+
+    def __init__(self, response):
+        self.response = response
+
+    def execute(self, http=None):
+        return self.response
+
+
+class FakeResource(object):
+    """Resource of the fake client, which answers list() with its handler."""
+
+    def __init__(self, client, name, handler):
+        self.client = client
+        self.name = name
+        self.handler = handler
+
+    def list(self, **kwargs):
+        self.client.calls.append((self.name, kwargs))
+        return FakeRequest(self.handler(kwargs))
+
+
+class FakeYouTube(object):
+    """YouTube API client, which counts calls.
+
+    Video 'vN' belongs to channel 'cM', where M is N modulo channel_count.
+    """
+
+    def __init__(self, channel_count=3):
+        self.channel_count = channel_count
+        self.calls = []
+
+    def videos(self):
+        return FakeResource(self, 'videos', self._list_videos)
+
+    def channels(self):
+        return FakeResource(self, 'channels', self._list_channels)
+
+    def count(self, name):
+        return len([call for call in self.calls if call[0] == name])
+
+    def _list_videos(self, kwargs):
+        ids = kwargs['id'].split(',')
+        assert len(ids) <= MAX_IDS_PER_REQUEST
+        return dict(items=[
+            dict(id=video_id, snippet=dict(
+                title='Title {}'.format(video_id),
+                channelId='c{}'.format(int(video_id[1:]) % self.channel_count)
+            ))
+            for video_id in ids if not video_id.startswith('missing')
+        ])
+
+    def _list_channels(self, kwargs):
+        ids = kwargs['id'].split(',')
+        assert len(ids) <= MAX_IDS_PER_REQUEST
+        return dict(items=[dict(id=channel_id, snippet=dict(title='Channel ' + channel_id))
+                           for channel_id in ids])
+
+
+class VideoResolverTest(unittest.TestCase):
+
+    def test_videos_are_resolved_in_batches(self):
+        for count in (1, 49, 50, 51, 120):
+            youtube = FakeYouTube()
+            videos = VideoResolver(youtube).resolve(['v{}'.format(i) for i in range(count)])
+
+            self.assertEqual(len(videos), count)
+            self.assertEqual(youtube.count('videos'), -(-count // MAX_IDS_PER_REQUEST))
+
+    def test_channels_are_resolved_in_one_batch(self):
+        youtube = FakeYouTube(channel_count=3)
+        videos = VideoResolver(youtube).resolve(['v{}'.format(i) for i in range(100)])
+
+        self.assertEqual(youtube.count('channels'), 1)
+        self.assertEqual(videos['v4'], dict(id='v4', title='Title v4', channel_name='Channel c1'))
+
+    def test_known_channels_are_not_requested_again(self):
+        youtube = FakeYouTube()
+        resolver = VideoResolver(youtube)
+        resolver.resolve(['v0', 'v1', 'v2'])
+        resolver.resolve(['v3', 'v4', 'v5'])
+
+        self.assertEqual(youtube.count('videos'), 2)
+        self.assertEqual(youtube.count('channels'), 1)
+
+    def test_duplicates_and_missing_videos(self):
+        youtube = FakeYouTube()
+        videos = VideoResolver(youtube).resolve(['v1', 'v1', 'missing'])
+
+        self.assertEqual(sorted(videos), ['v1'])
+        self.assertEqual(youtube.calls[0][1]['id'], 'v1,missing')
+
+
+if __name__ == '__main__':
+    unittest.main()